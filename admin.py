@@ -1,28 +1,113 @@
+import asyncio
+import logging
+import os
+import tempfile
+from datetime import datetime
 from aiogram import Router, types, F
-from utils import is_admin
-from db import get_db, _db_lock
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
+from tenants import Tenant, is_operator
+from utils import split_message, time_now, days_ago
+from cache import user_cache
+from db import read, fetchall, execute, add_log
+from rollups import daily_report
+from tasks import increment_strike
+from metrics import summary
+from queries import SQL
+from bulk import BULK_ACTIONS, EXPORT_TABLES, parse_ids, apply_bulk, export_table
+from backup import BackupError, backup_job
 
 router = Router()
 
+PAGE_SIZE = 25
+BACKUP_PROGRESS_INTERVAL = 3
+_backup_tasks = set()  # strong refs to running backups and their progress watchers
+
+# name -> (title, params factory for queries.PANEL_WHERE[name] after the tenant id)
+PANEL_FILTERS = {
+    "strikes": ("Users with 2+ strikes", lambda: ()),
+    "banned": ("Banned users", lambda: (time_now(),)),
+    "paused": ("Paused users", lambda: ()),
+    "active": ("Active in the last 7 days", lambda: (days_ago(7),)),
+}
+
+async def panel_page(name, tenant_id, direction="next", cursor=None):
+    """One page of a tenant's users for a panel filter, highest strikes first.
+
+    Rows are ordered by (strikes, id) descending; `cursor` is the (strikes, id)
+    of the row the page starts after ("next") or before ("prev").
+    Returns (rows, has_prev, has_next).
+    """
+    params = (tenant_id,) + PANEL_FILTERS[name][1]()
+    limit = PAGE_SIZE + 1
+    if cursor is None:
+        sql = SQL[f"panel_first_{name}"]
+        params += (limit,)
+    else:
+        sql = SQL[f"panel_{direction}_{name}"]
+        params = params + (cursor[0], cursor[1], limit) + params + (cursor[0], limit, limit)
+    rows = await fetchall(sql, params)
+    more = len(rows) > PAGE_SIZE
+    rows = rows[:PAGE_SIZE]
+    if direction == "prev" and cursor is not None:
+        return rows[::-1], more, True
+    return rows, cursor is not None, more
+
+def panel_kb(name, rows, has_prev, has_next):
+    nav = []
+    if has_prev and rows:
+        nav.append(InlineKeyboardButton(text="◀ Prev", callback_data=f"adm_{name}_prev_{rows[0]['strikes']}_{rows[0]['id']}"))
+    if has_next and rows:
+        nav.append(InlineKeyboardButton(text="Next ▶", callback_data=f"adm_{name}_next_{rows[-1]['strikes']}_{rows[-1]['id']}"))
+    filters = [InlineKeyboardButton(text=f, callback_data=f"adm_{f}_next") for f in PANEL_FILTERS if f != name]
+    return InlineKeyboardMarkup(inline_keyboard=[row for row in (nav, filters) if row])
+
+async def render_panel(name, tenant_id, direction="next", cursor=None):
+    rows, has_prev, has_next = await panel_page(name, tenant_id, direction, cursor)
+    reply = f"👮‍♀️ Admin Panel:\n\n{PANEL_FILTERS[name][0]}:\n"
+    for u in rows:
+        reply += f"- @{u['username']} (TG: {u['tg_id']}) — Strikes: {u['strikes']}\n"
+    if not rows:
+        reply += "(none)\n"
+    return split_message(reply), panel_kb(name, rows, has_prev, has_next)
+
 @router.message(F.text.startswith("/adminpanel"))
-async def admin_panel(message: types.Message):
-    if not is_admin(message.from_user.id):
+async def admin_panel(message: types.Message, tenant: Tenant):
+    if not tenant.is_admin(message.from_user.id):
         await message.answer("Not authorized.")
         return
+    parts = message.text.split()
+    name = parts[1] if len(parts) > 1 else "strikes"
+    if name not in PANEL_FILTERS:
+        await message.answer("Usage: /adminpanel [" + "|".join(PANEL_FILTERS) + "]")
+        return
+    chunks, kb = await render_panel(name, tenant.id)
+    for chunk in chunks[:-1]:
+        await message.answer(chunk)
+    await message.answer(chunks[-1], reply_markup=kb)
 
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("SELECT * FROM users WHERE strikes >= 2")
-        users = c.fetchall()
-        reply = "👮‍♀️ Admin Panel:\n\nUsers with 2+ strikes:\n"
-        for u in users:
-            reply += f"- @{u['username']} (TG: {u['tg_id']}) — Strikes: {u['strikes']}\n"
-        await message.answer(reply)
+@router.callback_query(F.data.startswith("adm_"))
+async def admin_panel_cb(call: types.CallbackQuery, tenant: Tenant):
+    if not tenant.is_admin(call.from_user.id):
+        await call.answer("Not authorized.")
+        return
+    parts = call.data.split("_")
+    name, direction = parts[1], parts[2]
+    cursor = (int(parts[3]), int(parts[4])) if len(parts) == 5 else None
+    if name not in PANEL_FILTERS:
+        await call.answer()
+        return
+    chunks, kb = await render_panel(name, tenant.id, direction, cursor)
+    await call.answer()
+    if len(chunks) == 1:
+        await call.message.edit_text(chunks[0], reply_markup=kb)
+        return
+    for chunk in chunks[:-1]:
+        await call.message.answer(chunk)
+    await call.message.answer(chunks[-1], reply_markup=kb)
 
 @router.message(F.text.startswith("/strike"))
-async def admin_strike(message: types.Message):
-    if not is_admin(message.from_user.id):
+async def admin_strike(message: types.Message, tenant: Tenant):
+    if not tenant.is_admin(message.from_user.id):
         await message.answer("Not authorized.")
         return
     parts = message.text.split()
@@ -30,15 +115,131 @@ async def admin_strike(message: types.Message):
         await message.answer("Usage: /strike <add|remove> <tg_id>")
         return
     action, tg_id = parts[1], int(parts[2])
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        if action == "add":
-            c.execute("UPDATE users SET strikes = strikes + 1 WHERE tg_id=?", (tg_id,))
-        elif action == "remove":
-            c.execute("UPDATE users SET strikes = MAX(strikes-1, 0) WHERE tg_id=?", (tg_id,))
-        else:
-            await message.answer("Action must be add or remove.")
+    if action == "add":
+        await increment_strike(tg_id, tenant.id)
+    elif action == "remove":
+        await execute(SQL["unstrike_user_by_tg"], (tenant.id, tg_id))
+    else:
+        await message.answer("Action must be add or remove.")
+        return
+    user_cache.invalidate((tenant.id, tg_id))
+    await add_log("admin_strike", None, f"tg_id={tg_id} action={action} by={message.from_user.id}")
+    await message.answer(f"Strike {action}ed for user {tg_id}.")
+
+@router.message(F.text == "/adminstats")
+async def admin_stats(message: types.Message):
+    if not is_operator(message.from_user.id):
+        await message.answer("Not authorized.")
+        return
+    await message.answer(summary()[:4096])
+
+BULK_USAGE = ("Usage: /bulk <" + "|".join(BULK_ACTIONS) + "> <id> <id> ...\n"
+              "or send a CSV of ids with the caption /bulk <action>.\n"
+              "Ids are tg_ids, except for deactivate which takes video ids.")
+
+async def run_bulk(message, tenant, command, text):
+    parts = command.split(maxsplit=2)
+    action = parts[1] if len(parts) > 1 else None
+    if action not in BULK_ACTIONS:
+        await message.answer(BULK_USAGE)
+        return
+    ids = parse_ids(text)
+    if not ids:
+        await message.answer("No ids given.\n" + BULK_USAGE)
+        return
+    changed = await apply_bulk(action, ids, tenant.id)
+    await add_log("admin_bulk", None, f"action={action} ids={len(ids)} changed={changed} by={message.from_user.id}")
+    await message.answer(f"Bulk {action}: {changed} of {len(ids)} {BULK_ACTIONS[action][1]}s updated.")
+
+@router.message(F.text.startswith("/bulk"))
+async def admin_bulk(message: types.Message, tenant: Tenant):
+    if not tenant.is_admin(message.from_user.id):
+        await message.answer("Not authorized.")
+        return
+    parts = message.text.split(maxsplit=2)
+    await run_bulk(message, tenant, message.text, parts[2] if len(parts) > 2 else "")
+
+@router.message(F.document, F.caption.startswith("/bulk"))
+async def admin_bulk_csv(message: types.Message, tenant: Tenant):
+    if not tenant.is_admin(message.from_user.id):
+        await message.answer("Not authorized.")
+        return
+    data = await message.bot.download(message.document)
+    await run_bulk(message, tenant, message.caption, data.read().decode("utf-8", errors="replace"))
+
+@router.message(F.text.startswith("/export"))
+async def admin_export(message: types.Message, tenant: Tenant):
+    if not tenant.is_admin(message.from_user.id):
+        await message.answer("Not authorized.")
+        return
+    parts = message.text.split()
+    table = parts[1] if len(parts) > 1 else None
+    fmt = parts[2] if len(parts) > 2 else "csv"
+    if table not in EXPORT_TABLES or fmt not in ("csv", "ndjson"):
+        await message.answer("Usage: /export <" + "|".join(EXPORT_TABLES) + "> [csv|ndjson]")
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, f"{table}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}")
+        count = await export_table(table, fmt, path, tenant.id)
+        await message.answer_document(FSInputFile(path), caption=f"{table}: {count} rows")
+
+@router.message(F.text.startswith("/report"))
+async def admin_report(message: types.Message, tenant: Tenant):
+    if not tenant.is_admin(message.from_user.id):
+        await message.answer("Not authorized.")
+        return
+    parts = message.text.split()
+    days = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 7
+    report = await read(daily_report, days, tenant.id)
+    if not report:
+        await message.answer("No activity in that period.")
+        return
+    reply = f"📊 Last {days} days:\n"
+    for day, s in report.items():
+        decided = s["accepted"] + s["rejected"]
+        rate = f"{s['accepted'] * 100 // decided}%" if decided else "-"
+        latency = f"{s['review_seconds'] // s['reviews'] // 60}m" if s["reviews"] else "-"
+        reply += (f"{day}: tasks {s['assigned']}, proofs {s['proofs']}, accepted {rate}, "
+                  f"review {latency}, strikes {s['strikes']}\n")
+    for chunk in split_message(reply):
+        await message.answer(chunk)
+
+@router.message(F.text.startswith("/backup"))
+async def admin_backup(message: types.Message):
+    if not is_operator(message.from_user.id):
+        await message.answer("Not authorized.")
+        return
+    if message.text.split()[1:2] == ["status"] or backup_job.running:
+        await message.answer(backup_job.progress())
+        return
+    status = await message.answer("Backup started.")
+    # Not awaited: updates run one at a time per user, so this admin's next
+    # updates (/backup status included) would otherwise wait for the whole backup.
+    _spawn(watch_backup(status, message.from_user.id))
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _backup_tasks.add(task)
+    task.add_done_callback(_backup_tasks.discard)
+    return task
+
+async def watch_backup(status, admin_tg):
+    """Run a backup, editing `status` with its progress and then the outcome."""
+    job = _spawn(backup_job.run())
+    last = status.text
+    try:
+        while not job.done():
+            await asyncio.wait([job], timeout=BACKUP_PROGRESS_INTERVAL)
+            text = backup_job.progress()
+            if not job.done() and text != last:
+                await status.edit_text(text)
+                last = text
+        try:
+            path = job.result()
+        except BackupError as e:
+            await status.edit_text(f"Backup failed: {e}")
             return
-        conn.commit()
-    await message.answer(f"Strike {action}ed for user {tg_id}.")
\ No newline at end of file
+        await add_log("admin_backup", None, f"file={os.path.basename(path)} by={admin_tg}")
+        await status.edit_text(f"Backup done: {os.path.basename(path)} ({os.path.getsize(path) // 1024} KiB), integrity ok.")
+    except Exception:
+        logging.exception("Reporting backup progress failed")
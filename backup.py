@@ -0,0 +1,128 @@
+"""Online, compressed snapshots of the bot database.
+
+    python backup.py [--dir backups] [--keep 7]
+
+The snapshot is taken with SQLite's backup API, PAGES_PER_STEP pages at a
+time, from a dedicated connection on a worker thread that sleeps between
+steps. That connection holds one read transaction for the whole copy: in WAL
+mode this never blocks the writer or the pooled readers, and it pins a
+consistent snapshot, so the backup does not restart every time the bot
+commits. The copy is integrity-checked, gzipped to
+backups/mutual_bot-YYYYmmdd-HHMMSS-mmm-PID.db.gz and only the newest `keep`
+are kept.
+"""
+import argparse
+import asyncio
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+import db
+
+BACKUP_DIR = "backups"
+BACKUP_KEEP = 7
+PAGES_PER_STEP = 256
+STEP_PAUSE = 0.01
+
+class BackupError(Exception):
+    pass
+
+class BackupJob:
+    """Runs at most one backup at a time and exposes its progress."""
+
+    def __init__(self, backup_dir=BACKUP_DIR, keep=BACKUP_KEEP):
+        self.backup_dir = backup_dir
+        self.keep = keep
+        self.running = False
+        self.pages_done = 0
+        self.pages_total = 0
+        self.last_path = None
+        self.last_error = None
+
+    def progress(self):
+        """Short text for /backup status."""
+        if self.running:
+            pct = self.pages_done * 100 // self.pages_total if self.pages_total else 0
+            return f"Backup running: {pct}% ({self.pages_done}/{self.pages_total} pages)"
+        if self.last_error:
+            return f"Last backup failed: {self.last_error}"
+        if self.last_path:
+            return f"Last backup: {os.path.basename(self.last_path)} ({os.path.getsize(self.last_path) // 1024} KiB)"
+        return "No backup taken yet."
+
+    async def run(self, path=None):
+        """Take one snapshot; returns the .db.gz path or raises BackupError."""
+        if self.running:
+            raise BackupError("a backup is already running")
+        self.running, self.pages_done, self.pages_total, self.last_error = True, 0, 0, None
+        try:
+            self.last_path = await asyncio.to_thread(self._run, path or db.DB_PATH)
+            return self.last_path
+        except Exception as e:
+            self.last_error = str(e)
+            raise BackupError(str(e)) from e
+        finally:
+            self.running = False
+
+    def _run(self, path):
+        os.makedirs(self.backup_dir, exist_ok=True)
+        # ms plus the pid, so a /backup and a CLI or scheduled run never share a file (or its .part files)
+        now = datetime.utcnow()
+        name = f"mutual_bot-{now:%Y%m%d-%H%M%S}-{now.microsecond // 1000:03d}-{os.getpid()}.db"
+        part = os.path.join(self.backup_dir, f".{name}.part")
+        final = os.path.join(self.backup_dir, name + ".gz")
+        try:
+            self._copy(path, part)
+            check = sqlite3.connect(part)
+            try:
+                result = check.execute("PRAGMA integrity_check").fetchone()[0]
+            finally:
+                check.close()
+            if result != "ok":
+                raise BackupError(f"integrity check failed: {result}")
+            with open(part, "rb") as src, gzip.open(final + ".part", "wb") as out:
+                shutil.copyfileobj(src, out, 1024 * 1024)
+            with open(final + ".part", "rb") as f:
+                os.fsync(f.fileno())
+            os.replace(final + ".part", final)
+        finally:
+            for leftover in (part, final + ".part"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        self._rotate()
+        return final
+
+    def _copy(self, path, part):
+        def step(status, remaining, total):
+            self.pages_done, self.pages_total = total - remaining, total
+            time.sleep(STEP_PAUSE)
+        src = db.get_db(path)
+        dst = sqlite3.connect(part)
+        try:
+            src.execute("BEGIN")
+            src.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()
+            src.backup(dst, pages=PAGES_PER_STEP, progress=step)
+            src.rollback()
+        finally:
+            dst.close()
+            src.close()
+
+    def _rotate(self):
+        snapshots = sorted(glob.glob(os.path.join(self.backup_dir, "mutual_bot-*.db.gz")))
+        for old in snapshots[:-self.keep] if self.keep else []:
+            os.remove(old)
+
+backup_job = BackupJob()
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Take a compressed online snapshot of the bot database.")
+    p.add_argument("--dir", default=BACKUP_DIR)
+    p.add_argument("--keep", type=int, default=BACKUP_KEEP)
+    args = p.parse_args(argv)
+    print(f"Wrote {asyncio.run(BackupJob(args.dir, args.keep).run())}")
+
+if __name__ == "__main__":
+    main()
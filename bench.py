@@ -0,0 +1,182 @@
+"""Micro-benchmarks for the data layer at several table sizes.
+
+    python bench.py --scales 10000,100000,1000000 --out bench.json
+    python bench.py --baseline bench.json
+
+Each scale gets a fresh temporary database filled by a seeded generator with
+skewed popularity (a few videos and owners get most of the tasks, a few
+viewers do most of the watching). Every benchmarked call is timed on its own
+and reported as p50/p95 microseconds. The run fails (exit 1) when a function
+slows down by more than --max-scaling between the smallest and largest
+scale, or when that ratio grows more than --tolerance times past the
+baseline's.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import db
+import tasks
+from matching import video_index
+from utils import time_now, DAY_MS
+
+def generate(path, n_tasks, seed=0):
+    """Fill a new database at `path` with about n_tasks tasks; returns ids the benchmarks draw from."""
+    rng = random.Random(seed)
+    db.DB_PATH = path
+    db.init_db()
+    n_users = max(100, n_tasks // 20)
+    n_videos = n_users * 2
+    now = time_now()
+    conn = db.get_db(path)
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO users (id, tg_id, username, strikes, paused, last_active) VALUES (?, ?, ?, ?, 0, ?)",
+                     ((i, 1_000_000 + i, f"user{i}", rng.choice((0, 0, 0, 1, 2)), now - rng.randrange(30 * DAY_MS))
+                      for i in range(1, n_users + 1)))
+    owners = [rng.randint(1, n_users) for _ in range(n_videos)]
+    conn.executemany("INSERT INTO videos (id, user_id, title, thumbnail_file_id, duration, yt_link, uploaded_at, active) "
+                     "VALUES (?, ?, ?, 'thumb', 60, '', ?, 1)",
+                     ((i, owners[i - 1], f"video {i}", now - 60 * DAY_MS) for i in range(1, n_videos + 1)))
+    # Zipf-like weights: the k-th video / viewer is picked ~1/k as often as the first.
+    video_weights = [1 / k for k in range(1, n_videos + 1)]
+    viewer_weights = [1 / k for k in range(1, n_users + 1)]
+    vids = rng.choices(range(1, n_videos + 1), video_weights, k=n_tasks)
+    viewers = rng.choices(range(1, n_users + 1), viewer_weights, k=n_tasks)
+    rows, pending = [], []
+    for i in range(n_tasks):
+        assigned = now - rng.randrange(60 * DAY_MS)
+        state = rng.random()
+        proof = assigned + rng.randrange(60 * 60 * 1000) if state < 0.9 else None
+        fresh = 0.8 <= state < 0.89  # awaiting review; the rest of the pending band is stale
+        if fresh:
+            proof = now - rng.randrange(60 * 60 * 1000)
+        verified = 1 if state < 0.8 else 0
+        result = ("accepted" if state < 0.7 else "rejected") if verified else None
+        expired = 1 if 0.7 <= state < 0.8 else 0
+        rows.append((vids[i], viewers[i], assigned, "proof" if proof else None, proof, verified, result,
+                     proof + 60_000 if verified else None, expired))
+        if fresh:
+            pending.append((i + 1, owners[vids[i] - 1]))
+    conn.executemany("INSERT INTO tasks (video_id, assigned_to, assigned_at, proof_file_id, proof_uploaded_at, "
+                     "verified, verification_result, verification_at, expired) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+    conn.close()
+    rng.shuffle(pending)
+    return {"users": n_users, "videos": n_videos, "pending": pending,
+            "reviewers": sorted({owner for _, owner in pending})}
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def timed(samples, coro):
+    start = time.perf_counter()
+    result = await coro
+    samples.append(time.perf_counter() - start)
+    return result
+
+async def bench_scale(n_tasks, iterations, seed):
+    with tempfile.TemporaryDirectory() as tmp:
+        data = generate(os.path.join(tmp, "bench.db"), n_tasks, seed)
+        rng = random.Random(seed + 1)
+        db.open_pool()
+        samples = {name: [] for name in ("load_video_index", "get_next_video_for_user", "get_next_video_heavy_viewer",
+                                         "assign_task",
+                                         "get_task_for_review", "verify_task", "increment_strike",
+                                         "remove_expired_tasks_and_proofs")}
+        try:
+            video_index.loaded = False
+            await timed(samples["load_video_index"], tasks.load_video_index())
+            # next_for's worst case: a viewer already assigned the best-ranked 99% of the videos.
+            heavy = data["users"] + 1
+            ranked = sorted(video_index._views, key=lambda vid: (video_index._key(vid), vid))
+            for vid in ranked[:len(ranked) * 99 // 100]:
+                video_index.record_assignment(vid, heavy)
+            pending = iter(data["pending"])
+            for i in range(iterations):
+                user_id = rng.randint(1, data["users"])
+                vid = await timed(samples["get_next_video_for_user"], tasks.get_next_video_for_user(user_id))
+                if vid:
+                    await timed(samples["assign_task"], tasks.assign_task(vid, user_id))
+                await timed(samples["get_next_video_heavy_viewer"], tasks.get_next_video_for_user(heavy))
+                await timed(samples["get_task_for_review"],
+                            tasks.get_task_for_review(rng.choice(data["reviewers"])))
+                task_id, owner = next(pending, (None, None))
+                if task_id is not None:  # small scales can run out of reviews before iterations end
+                    await timed(samples["verify_task"], tasks.verify_task(task_id, owner, 0, rng.random() < 0.8))
+                await timed(samples["increment_strike"], tasks.increment_strike(1_000_000 + user_id))
+                if i % 10 == 0:
+                    await timed(samples["remove_expired_tasks_and_proofs"], db.remove_expired_tasks_and_proofs())
+        finally:
+            db.close_pool()
+            video_index.__init__()
+    return {name: {"n": len(s), "p50_us": round(percentile(s, 0.5) * 1e6, 1), "p95_us": round(percentile(s, 0.95) * 1e6, 1)}
+            for name, s in samples.items() if s}
+
+def scaling(result):
+    """{function: p50 at the largest scale / p50 at the smallest}."""
+    scales = sorted(result["scales"], key=int)
+    small, large = result["scales"][scales[0]], result["scales"][scales[-1]]
+    return {name: round(large[name]["p50_us"] / max(small[name]["p50_us"], 1), 2) for name in small if name in large}
+
+def check(result, baseline=None, max_scaling=10.0, tolerance=3.0):
+    """Return a list of failure messages (empty when the run passes)."""
+    failures = []
+    ratios = scaling(result)
+    base = scaling(baseline) if baseline else {}
+    for name, ratio in ratios.items():
+        if name in ("load_video_index", "get_next_video_heavy_viewer"):
+            continue  # linear by design: loads every row / one pass over the videos (see matching.VideoIndex)
+        if ratio > max_scaling:
+            failures.append(f"{name}: {ratio}x slower at the largest scale (limit {max_scaling}x)")
+        if name in base and ratio > base[name] * tolerance:
+            failures.append(f"{name}: scaling {ratio}x vs baseline {base[name]}x (tolerance {tolerance}x)")
+    return failures
+
+async def run(args):
+    result = {"seed": args.seed, "iterations": args.iterations, "scales": {}}
+    for n in args.scales:
+        result["scales"][str(n)] = await bench_scale(n, args.iterations, args.seed)
+    result["scaling"] = scaling(result)
+    return result
+
+def print_report(result):
+    for scale, funcs in result["scales"].items():
+        print(f"{int(scale):,} tasks")
+        for name, r in funcs.items():
+            print(f"  {name:<34}{r['p50_us']:>10}{r['p95_us']:>10}  us (p50/p95, n={r['n']})")
+    print("scaling (p50 largest / smallest):")
+    for name, ratio in result["scaling"].items():
+        print(f"  {name:<34}{ratio:>10}x")
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--scales", type=lambda s: [int(x) for x in s.split(",")], default=[10_000, 100_000, 1_000_000])
+    p.add_argument("--iterations", type=int, default=200)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", help="write the JSON result here")
+    p.add_argument("--baseline", help="JSON result of an earlier run to compare scaling against")
+    p.add_argument("--max-scaling", type=float, default=10.0)
+    p.add_argument("--tolerance", type=float, default=3.0)
+    return p.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = check(result, baseline, args.max_scaling, args.tolerance)
+    for msg in failures:
+        print("FAIL", msg, file=sys.stderr)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,103 @@
+import asyncio
+import csv
+import io
+import json
+import rollups
+from cache import user_cache
+from db import get_db, write
+from matching import video_index
+from queries import SQL
+from scheduler import expiry_scheduler
+from utils import time_now, DAY_MS
+
+BAN_DAYS = 7
+
+# action -> (statement run once per id, what the ids are)
+BULK_ACTIONS = {
+    "strike": (SQL["bulk_strike"], "tg_id"),
+    "unstrike": (SQL["bulk_unstrike"], "tg_id"),
+    "ban": (SQL["bulk_ban"], "tg_id"),
+    "unban": (SQL["bulk_unban"], "tg_id"),
+    "pause": (SQL["bulk_pause"], "tg_id"),
+    "resume": (SQL["bulk_resume"], "tg_id"),
+    "deactivate": (SQL["bulk_deactivate"], "video_id"),
+}
+
+EXPORT_TABLES = ("users", "videos", "tasks")
+
+def parse_ids(text):
+    """Integer ids from whitespace/comma separated text or CSV; non-numeric cells (headers) are skipped."""
+    ids = []
+    for row in csv.reader(io.StringIO(text.replace(" ", ",").replace("\t", ","))):
+        for cell in row:
+            cell = cell.strip()
+            if cell.lstrip("-").isdigit():
+                ids.append(int(cell))
+    return list(dict.fromkeys(ids))
+
+async def apply_bulk(action, ids, tenant_id):
+    """Apply one admin action to many ids of one tenant in a single transaction; returns rows changed."""
+    sql, _ = BULK_ACTIONS[action]
+    banned_until = time_now() + BAN_DAYS * DAY_MS
+    deactivated = []
+    def run(conn):
+        if action == "deactivate":
+            # One at a time so only this tenant's videos leave the matching index.
+            deactivated.extend(vid for vid in ids if conn.execute(sql, (tenant_id, vid)).rowcount)
+            return len(deactivated), []
+        if action == "ban":
+            params = [(banned_until, tenant_id, i) for i in ids]
+        else:
+            params = [(tenant_id, i) for i in ids]
+        changed = conn.executemany(sql, params).rowcount
+        user_ids = []
+        if action in ("ban", "strike"):
+            for tg_id in ids:
+                row = conn.execute(SQL["user_id_by_tg"], (tenant_id, tg_id)).fetchone()
+                if row:
+                    user_ids.append(row["id"])
+        if action == "strike":
+            for uid in user_ids:
+                rollups.on_strike(conn, uid)
+        return changed, user_ids if action == "ban" else []
+    changed, banned = await write(run)
+    if action == "deactivate":
+        for vid in deactivated:
+            video_index.remove_video(vid)
+    else:
+        for tg_id in ids:
+            user_cache.invalidate((tenant_id, tg_id))
+    for uid in banned:
+        expiry_scheduler.schedule("ban", uid, banned_until)
+    return changed
+
+def _export(table, fmt, out, tenant_id):
+    # A dedicated connection streams rows straight from SQLite's cursor to the
+    # file, so memory stays flat and no pooled reader is tied up.
+    conn = get_db()
+    try:
+        cur = conn.execute(SQL[f"export_{table}"], (tenant_id,))
+        columns = [d[0] for d in cur.description]
+        count = 0
+        if fmt == "csv":
+            writer = csv.writer(out)
+            writer.writerow(columns)
+            for row in cur:
+                writer.writerow(row)
+                count += 1
+        else:
+            for row in cur:
+                out.write(json.dumps(dict(zip(columns, row)), default=str) + "\n")
+                count += 1
+        return count
+    finally:
+        conn.close()
+
+async def export_table(table, fmt, path, tenant_id):
+    """Write one tenant's rows of a table to `path` as csv or ndjson; returns the row count."""
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table: {table}")
+    def run():
+        with open(path, "w", newline="", encoding="utf-8") as out:
+            return _export(table, fmt, out, tenant_id)
+    return await asyncio.to_thread(run)
@@ -1,18 +1,132 @@
+import asyncio
+import logging
+import queue
 import sqlite3
-import threading
-from datetime import datetime, timedelta
+import time
+from concurrent.futures import ThreadPoolExecutor
+from metrics import TimedConnection, registry
+from migrations import migrate
+from queries import SQL
+from tenants import current_tenant
+from utils import time_now, SECOND_MS
 
 DB_PATH = "mutual_bot.db"
-_db_lock = threading.Lock()
+READ_POOL_SIZE = 4
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+def get_db(path=None):
+    conn = sqlite3.connect(path or DB_PATH, check_same_thread=False, timeout=30, isolation_level=None,
+                           factory=TimedConnection, cached_statements=len(SQL) + 64)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
     return conn
 
-def init_db():
-    with _db_lock:
-        conn = get_db()
+def _tenant_label(tenant):
+    return "background" if tenant is None else str(tenant)
+
+class Pool:
+    """One serialized writer connection plus a bounded set of reader connections.
+
+    Every callable runs on a worker thread with a connection checked out for it,
+    so the event loop never blocks on SQLite and nothing awaits the network while
+    a connection is held.
+    """
+
+    def __init__(self, path=None, readers=READ_POOL_SIZE):
+        self.path = path or DB_PATH
+        self._writer = get_db(self.path)
+        self._readers = queue.SimpleQueue()
+        self._all = [self._writer]
+        for _ in range(readers):
+            conn = get_db(self.path)
+            self._readers.put(conn)
+            self._all.append(conn)
+        self._write_exec = ThreadPoolExecutor(1, thread_name_prefix="db-writer")
+        self._read_exec = ThreadPoolExecutor(readers, thread_name_prefix="db-reader")
+
+    async def read(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_exec, self._run_read, fn, args, time.perf_counter(),
+                                          current_tenant.get())
+
+    async def write(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._write_exec, self._run_write, fn, args, time.perf_counter(),
+                                          current_tenant.get())
+
+    def _run_read(self, fn, args, queued, tenant):
+        conn = self._readers.get()
+        start = time.perf_counter()
+        registry.observe("bot_db_lock_wait_seconds", start - queued, mode="read")
+        try:
+            return fn(conn, *args)
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+            held = time.perf_counter() - start
+            registry.observe("bot_db_lock_hold_seconds", held, mode="read")
+            registry.observe("bot_tenant_db_seconds", held, tenant=_tenant_label(tenant))
+
+    def _run_write(self, fn, args, queued, tenant):
+        conn = self._writer
+        start = time.perf_counter()
+        registry.observe("bot_db_lock_wait_seconds", start - queued, mode="write")
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn, *args)
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+            return result
+        finally:
+            held = time.perf_counter() - start
+            registry.observe("bot_db_lock_hold_seconds", held, mode="write")
+            registry.observe("bot_tenant_db_seconds", held, tenant=_tenant_label(tenant))
+
+    def close(self):
+        self._write_exec.shutdown(wait=True)
+        self._read_exec.shutdown(wait=True)
+        for conn in self._all:
+            conn.close()
+
+_pool = None
+
+def open_pool(path=None, readers=READ_POOL_SIZE):
+    global _pool
+    if _pool is None:
+        _pool = Pool(path, readers)
+    return _pool
+
+def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+
+async def read(fn, *args):
+    """Run fn(conn, *args) on a reader connection."""
+    return await _pool.read(fn, *args)
+
+async def write(fn, *args):
+    """Run fn(conn, *args) inside a single write transaction."""
+    return await _pool.write(fn, *args)
+
+async def fetchone(sql, params=()):
+    return await read(lambda conn: conn.execute(sql, params).fetchone())
+
+async def fetchall(sql, params=()):
+    return await read(lambda conn: conn.execute(sql, params).fetchall())
+
+async def execute(sql, params=()):
+    """Run a single write statement and return its cursor (for lastrowid/rowcount)."""
+    return await write(lambda conn: conn.execute(sql, params))
+
+def init_db(path=None):
+    conn = get_db(path)
+    try:
         c = conn.cursor()
         c.execute("""
         CREATE TABLE IF NOT EXISTS users (
@@ -21,8 +135,8 @@ def init_db():
             username TEXT,
             strikes INTEGER DEFAULT 0,
             paused INTEGER DEFAULT 0,
-            last_active TIMESTAMP,
-            banned_until TIMESTAMP
+            last_active INTEGER,
+            banned_until INTEGER
         )""")
         c.execute("""
         CREATE TABLE IF NOT EXISTS videos (
@@ -32,7 +146,7 @@ def init_db():
             thumbnail_file_id TEXT,
             duration INTEGER,
             yt_link TEXT,
-            uploaded_at TIMESTAMP,
+            uploaded_at INTEGER,
             active INTEGER DEFAULT 1,
             FOREIGN KEY (user_id) REFERENCES users (id)
         )""")
@@ -41,12 +155,12 @@ def init_db():
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             video_id INTEGER,
             assigned_to INTEGER,
-            assigned_at TIMESTAMP,
+            assigned_at INTEGER,
             proof_file_id TEXT,
-            proof_uploaded_at TIMESTAMP,
+            proof_uploaded_at INTEGER,
             verified INTEGER DEFAULT 0,
             verification_result TEXT,
-            verification_at TIMESTAMP,
+            verification_at INTEGER,
             reviewer_msg TEXT,
             reviewer_id INTEGER,
             expired INTEGER DEFAULT 0,
@@ -59,30 +173,84 @@ def init_db():
             event TEXT,
             user_id INTEGER,
             details TEXT,
-            created_at TIMESTAMP
+            created_at INTEGER
         )""")
-        conn.commit()
+        migrate(conn)
+    finally:
         conn.close()
 
-def add_log(event, user_id, details):
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("INSERT INTO logs (event, user_id, details, created_at) VALUES (?, ?, ?, ?)",
-                  (event, user_id, details, datetime.utcnow()))
-        conn.commit()
-        conn.close()
+class LogWriter:
+    """Write-behind queue for the logs table.
 
-def remove_expired_tasks_and_proofs():
-    """Deletes expired or unused proofs and tasks daily."""
-    now = datetime.utcnow()
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        # Mark tasks as expired if more than 4 hours passed since proof upload and not verified
-        c.execute("""
-            UPDATE tasks SET expired=1 WHERE proof_uploaded_at IS NOT NULL AND verified=0 
-            AND expired=0 AND proof_uploaded_at <= ?
-        """, ((now - timedelta(hours=4)).isoformat(),))
-        conn.commit()
-        conn.close()
\ No newline at end of file
+    Events are buffered in memory and inserted with one executemany per batch,
+    once `batch_size` rows are waiting or `flush_interval` seconds have passed.
+    A full queue makes add_log wait, which is the backpressure on producers.
+    """
+
+    def __init__(self, batch_size=200, flush_interval=1.0, max_queue=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None
+
+    def start(self):
+        self._queue = asyncio.Queue(self.max_queue)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued and stop the background task."""
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def put(self, row):
+        await self._queue.put(row)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            row = await self._queue.get()
+            rows = [] if row is None else [row]
+            deadline = loop.time() + self.flush_interval
+            while row is not None and len(rows) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is not None:
+                    rows.append(row)
+            try:
+                await self._flush(rows)
+            except Exception:
+                logging.exception("Dropped %d log rows", len(rows))
+            if row is None:
+                return
+
+    async def _flush(self, rows):
+        if rows:
+            await write(lambda conn: conn.executemany(
+                SQL["insert_log"], rows))
+
+log_writer = LogWriter()
+
+async def add_log(event, user_id, details):
+    row = (event, user_id, details, time_now())
+    if log_writer.running:
+        await log_writer.put(row)
+    else:
+        await log_writer._flush([row])
+
+async def remove_expired_tasks_and_proofs():
+    """Bulk sweep of stale proofs; at runtime scheduler.ExpiryScheduler expires them on time."""
+    # Mark tasks as expired if more than 4 hours passed since proof upload and not verified
+    await execute(SQL["expire_stale_proofs"], (time_now() - 4 * 60 * 60 * SECOND_MS,))
@@ -1,27 +1,34 @@
+from dataclasses import replace
 from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
 from fsm import UploadVideoFSM, SubmitProofFSM, RemoveVideoFSM
-from db import get_db, _db_lock, add_log
+from db import fetchone, fetchall, execute, add_log
 from tasks import (
-    get_next_video_for_user, assign_task, get_task_for_review,
-    mark_task_verified, increment_strike, reset_task_after_rejection,
+    get_next_video_for_user, assign_task, get_task_for_review, get_tasks_for_review,
+    open_task, skip_task, submit_proof, verify_task, verify_tasks,
+    add_video, deactivate_video,
 )
+from cache import user_cache
+from middlewares import load_user
+from notify import notifier
+from queries import SQL
+from tenants import Tenant
 from utils import is_admin, time_now
 from aiogram.types import (
     ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton,
-    InputMediaPhoto
+    InputMediaPhoto, InputMediaDocument
 )
 
 router = Router()
 
 def main_menu():
-    kb = ReplyKeyboardMarkup(resize_keyboard=True)
-    kb.add(KeyboardButton('/upload'), KeyboardButton('/gettask'))
-    kb.add(KeyboardButton('/submitproof'), KeyboardButton('/remove'))
-    kb.add(KeyboardButton('/status'), KeyboardButton('/strikes'))
-    kb.add(KeyboardButton('/pause'), KeyboardButton('/resume'))
-    kb.add(KeyboardButton('/rules'), KeyboardButton('/menu'))
-    return kb
+    return ReplyKeyboardMarkup(resize_keyboard=True, keyboard=[
+        [KeyboardButton(text='/upload'), KeyboardButton(text='/gettask')],
+        [KeyboardButton(text='/submitproof'), KeyboardButton(text='/remove')],
+        [KeyboardButton(text='/status'), KeyboardButton(text='/strikes')],
+        [KeyboardButton(text='/pause'), KeyboardButton(text='/resume')],
+        [KeyboardButton(text='/rules'), KeyboardButton(text='/menu')],
+    ])
 
 def yes_no_kb(action):
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -35,16 +42,24 @@ def proof_review_kb(task_id):
         [InlineKeyboardButton(text="❌ I skipped something", callback_data=f"verify_{task_id}_fail")]
     ])
 
+def review_batch_kb(task_ids, marks):
+    rows = []
+    for n, tid in enumerate(task_ids, 1):
+        mark = marks.get(str(tid))
+        rows.append([
+            InlineKeyboardButton(text=f"{n}. {'✅ ' if mark == 'ok' else ''}Accept", callback_data=f"rvb_{tid}_ok"),
+            InlineKeyboardButton(text=f"{n}. {'❌ ' if mark == 'fail' else ''}Reject", callback_data=f"rvb_{tid}_fail"),
+        ])
+    rows.append([InlineKeyboardButton(text="✅ Accept the rest", callback_data="rvb_rest_ok"),
+                 InlineKeyboardButton(text="📨 Submit", callback_data="rvb_submit")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
 @router.message(F.text == "/start")
-async def start_cmd(message: types.Message):
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("SELECT id FROM users WHERE tg_id=?", (message.from_user.id,))
-        if not c.fetchone():
-            c.execute("INSERT INTO users (tg_id, username, last_active) VALUES (?, ?, ?)",
-                (message.from_user.id, message.from_user.username, time_now()))
-            conn.commit()
+async def start_cmd(message: types.Message, tenant: Tenant):
+    await execute(SQL["insert_user"],
+        (tenant.id, message.from_user.id, message.from_user.username, time_now()))
+    user_cache.invalidate((tenant.id, message.from_user.id))
+    await load_user(message.from_user.id, tenant.id)
     await message.answer(
         "👋 Welcome! Use the menu below to get started.",
         reply_markup=main_menu())
@@ -77,26 +92,24 @@ async def menu_cmd(message: types.Message):
 
 # FSM: /upload
 @router.message(F.text == "/upload")
-async def upload_cmd(message: types.Message, state: FSMContext):
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("SELECT id FROM users WHERE tg_id=?", (message.from_user.id,))
-        uid = c.fetchone()
-        if not uid:
-            await message.answer("Please /start first.")
-            return
-        uid = uid["id"]
-        c.execute("SELECT COUNT(*) as cnt FROM videos WHERE user_id=? AND active=1", (uid,))
-        if c.fetchone()["cnt"] >= 5:
-            await message.answer("You already have 5 active videos. Remove one with /remove before uploading a new one.")
-            return
+async def upload_cmd(message: types.Message, state: FSMContext, user: dict | None):
+    if not user:
+        await message.answer("Please /start first.")
+        return
+    uid = user["id"]
+    cnt = await fetchone(SQL["count_active_videos"], (uid,))
+    if cnt["cnt"] >= 5:
+        await message.answer("You already have 5 active videos. Remove one with /remove before uploading a new one.")
+        return
     await state.set_state(UploadVideoFSM.waiting_for_title)
     await message.answer("Send me your video *title* (max 100 chars):", parse_mode="Markdown")
 
 @router.message(UploadVideoFSM.waiting_for_title)
 async def upload_title(message: types.Message, state: FSMContext):
-    title = message.text.strip()
+    title = (message.text or "").strip()
+    if not title:
+        await message.answer("Please send the title as text.")
+        return
     if len(title) > 100:
         await message.answer("Title too long. Please send a title under 100 characters.")
         return
@@ -129,260 +142,286 @@ async def upload_duration(message: types.Message, state: FSMContext):
     await message.answer("Paste your YouTube video link (optional, or say skip):")
 
 @router.message(UploadVideoFSM.waiting_for_link)
-async def upload_link(message: types.Message, state: FSMContext):
-    yt_link = message.text.strip() if "skip" not in message.text.lower() else ""
+async def upload_link(message: types.Message, state: FSMContext, user: dict | None):
+    text = (message.text or "").strip()
+    yt_link = text if "skip" not in text.lower() else ""
     data = await state.get_data()
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("SELECT id FROM users WHERE tg_id=?", (message.from_user.id,))
-        uid = c.fetchone()["id"]
-        c.execute("""
-            INSERT INTO videos (user_id, title, thumbnail_file_id, duration, yt_link, uploaded_at, active)
-            VALUES (?, ?, ?, ?, ?, ?, 1)
-        """, (uid, data["title"], data["thumbnail_file_id"], data["duration"], yt_link, time_now()))
-        conn.commit()
+    vid = await add_video(user["id"], data["title"], data["thumbnail_file_id"], data["duration"], yt_link, time_now(),
+                          tenant_id=user["tenant_id"])
+    await add_log("video_upload", user["id"], f"video={vid}")
     await message.answer("✅ Video uploaded! Use /gettask to start viewing others.", reply_markup=main_menu())
     await state.clear()
 
 # /remove video
 @router.message(F.text == "/remove")
-async def remove_cmd(message: types.Message, state: FSMContext):
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("SELECT id FROM users WHERE tg_id=?", (message.from_user.id,))
-        uid = c.fetchone()
-        if not uid:
-            await message.answer("Please /start first.")
-            return
-        uid = uid["id"]
-        c.execute("SELECT * FROM videos WHERE user_id=? AND active=1", (uid,))
-        vids = c.fetchall()
-        if not vids:
-            await message.answer("You have no active videos.")
-            return
-        reply = "Select a video to remove:\n"
-        kb = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text=v["title"], callback_data=f"removev_{v['id']}")] for v in vids
-        ])
-        await message.answer(reply, reply_markup=kb)
+async def remove_cmd(message: types.Message, state: FSMContext, user: dict | None):
+    if not user:
+        await message.answer("Please /start first.")
+        return
+    uid = user["id"]
+    vids = await fetchall(SQL["active_videos"], (uid,))
+    if not vids:
+        await message.answer("You have no active videos.")
+        return
+    reply = "Select a video to remove:\n"
+    kb = InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=v["title"], callback_data=f"removev_{v['id']}")] for v in vids
+    ])
+    await message.answer(reply, reply_markup=kb)
 
 @router.callback_query(F.data.startswith("removev_"))
-async def remove_video_cb(call: types.CallbackQuery):
+async def remove_video_cb(call: types.CallbackQuery, user: dict | None):
     vid = int(call.data.split("_")[1])
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("UPDATE videos SET active=0 WHERE id=?", (vid,))
-        conn.commit()
+    if not user or not await deactivate_video(vid, user["id"]):
+        await call.answer("This video is not yours to remove.")
+        return
     await call.answer("Removed!")
-    await call.message.edit_text("Video removed.", reply_markup=main_menu())
+    await call.message.edit_text("Video removed.")
 
 # /pause and /resume
 @router.message(F.text == "/pause")
-async def pause_cmd(message: types.Message):
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("SELECT id FROM users WHERE tg_id=?", (message.from_user.id,))
-        uid = c.fetchone()
-        if not uid:
-            await message.answer("Please /start first.")
-            return
-        uid = uid["id"]
-        # Check if any video is being reviewed
-        c.execute("""
-            SELECT t.id FROM tasks t 
-            JOIN videos v ON t.video_id = v.id 
-            WHERE v.user_id=? AND t.verified=0 AND t.expired=0 AND t.proof_uploaded_at IS NOT NULL
-        """, (uid,))
-        if c.fetchone():
-            await message.answer("Can't pause while someone is viewing your video.")
-            return
-        c.execute("UPDATE users SET paused=1 WHERE id=?", (uid,))
-        conn.commit()
+async def pause_cmd(message: types.Message, user: dict | None):
+    if not user:
+        await message.answer("Please /start first.")
+        return
+    uid = user["id"]
+    # Check if any video is being reviewed
+    if await get_task_for_review(uid):
+        await message.answer("Can't pause while someone is viewing your video.")
+        return
+    await execute(SQL["pause_user"], (uid,))
+    user_cache.invalidate((user["tenant_id"], message.from_user.id))
     await message.answer("You are paused. Use /resume to return.")
 
 @router.message(F.text == "/resume")
-async def resume_cmd(message: types.Message):
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("UPDATE users SET paused=0 WHERE tg_id=?", (message.from_user.id,))
-        conn.commit()
+async def resume_cmd(message: types.Message, tenant: Tenant):
+    await execute(SQL["resume_user"], (tenant.id, message.from_user.id))
+    user_cache.invalidate((tenant.id, message.from_user.id))
     await message.answer("Participation resumed.", reply_markup=main_menu())
 
 # /gettask
 @router.message(F.text == "/gettask")
-async def gettask_cmd(message: types.Message):
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("SELECT id, paused, strikes, banned_until FROM users WHERE tg_id=?", (message.from_user.id,))
-        u = c.fetchone()
-        if not u:
-            await message.answer("Please /start first.")
-            return
-        if u["paused"]:
-            await message.answer("You are paused. Use /resume to get tasks.")
-            return
-        if u["strikes"] >= 4:
-            await message.answer("You are banned due to strikes.")
-            return
-        # Check if any pending review tasks for this user
-        task = get_task_for_review(u["id"])
-        if task:
-            # Notify user to review proof first
-            await message.answer("You have a proof to review! Please verify the task before getting a new one.")
-            return
+async def gettask_cmd(message: types.Message, user: dict | None):
+    u = user
+    if not u:
+        await message.answer("Please /start first.")
+        return
+    if u["paused"]:
+        await message.answer("You are paused. Use /resume to get tasks.")
+        return
+    if u["strikes"] >= 4:
+        await message.answer("You are banned due to strikes.")
+        return
+    if u["banned_until"] and u["banned_until"] > time_now():
+        await message.answer("You are temporarily banned. Please try later.")
+        return
+    # Check if any pending review tasks for this user
+    task = await get_task_for_review(u["id"])
+    if task:
+        # Notify user to review proof first
+        await message.answer("You have a proof to review! Please verify the task before getting a new one.")
+        return
 
-        # Assign a new task
-        vid = get_next_video_for_user(u["id"])
-        if not vid:
-            await message.answer("No videos available at the moment. Please try later.")
-            return
-        t_id = assign_task(vid, u["id"])
-        # Get video details
-        c.execute("SELECT * FROM videos WHERE id=?", (vid,))
-        v = c.fetchone()
-        kb = yes_no_kb(f"accepttask_{t_id}")
-        await message.answer_photo(
-            v["thumbnail_file_id"], 
-            caption=f"Task:\nTitle: {v['title']}\nDuration: {v['duration']}s\n"
-                    f"{'Link: '+v['yt_link'] if v['yt_link'] else ''}\n\n"
-                    "1. Search the video on YouTube.\n"
-                    "2. Play at least 2 min.\n"
-                    "3. Like, Comment, Subscribe as instructed.\n"
-                    "4. Screen record the process.\n"
-                    "Ready? Press Yes to start, No to skip.",
-            reply_markup=kb
-        )
+    # Assign a new task
+    vid = await get_next_video_for_user(u["id"], u["tenant_id"])
+    if not vid:
+        await message.answer("No videos available at the moment. Please try later.")
+        return
+    t_id = await assign_task(vid, u["id"])
+    await add_log("task_assign", u["id"], f"task={t_id} video={vid}")
+    # Get video details
+    v = await fetchone(SQL["video_by_id"], (vid,))
+    kb = yes_no_kb(f"accepttask_{t_id}")
+    await message.answer_photo(
+        v["thumbnail_file_id"],
+        caption=f"Task:\nTitle: {v['title']}\nDuration: {v['duration']}s\n"
+                f"{'Link: '+v['yt_link'] if v['yt_link'] else ''}\n\n"
+                "1. Search the video on YouTube.\n"
+                "2. Play at least 2 min.\n"
+                "3. Like, Comment, Subscribe as instructed.\n"
+                "4. Screen record the process.\n"
+                "Ready? Press Yes to start, No to skip.",
+        reply_markup=kb
+    )
 
 @router.callback_query(F.data.startswith("accepttask_"))
-async def accepttask_cb(call: types.CallbackQuery):
+async def accepttask_cb(call: types.CallbackQuery, user: dict | None):
     t_id = int(call.data.split("_")[1].replace("yes","").replace("no",""))
+    uid = user["id"] if user else None
     if call.data.endswith("no"):
+        if not await skip_task(t_id, uid):
+            await call.answer("This task is no longer open.")
+            return
         await call.answer("Task skipped.")
-        with _db_lock:
-            conn = get_db()
-            c = conn.cursor()
-            c.execute("UPDATE tasks SET expired=1 WHERE id=?", (t_id,))
-            conn.commit()
-        await call.message.edit_text("Task skipped. Use /gettask to get a new task.", reply_markup=main_menu())
+        await add_log("task_skip", uid, f"task={t_id}")
+        await call.message.edit_text("Task skipped. Use /gettask to get a new task.")
         return
     # Accepted
+    if not await open_task(t_id, uid):
+        await call.answer("This task is no longer open.")
+        return
+    await add_log("task_accept", uid, f"task={t_id}")
     await call.answer("Task accepted. Complete and use /submitproof to upload your screen record.")
-    await call.message.edit_text("Task accepted. Complete the video view and use /submitproof.", reply_markup=main_menu())
+    await call.message.edit_text("Task accepted. Complete the video view and use /submitproof.")
 
 # /submitproof
 @router.message(F.text == "/submitproof")
-async def submitproof_cmd(message: types.Message, state: FSMContext):
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("SELECT t.id, v.title FROM tasks t JOIN videos v ON t.video_id = v.id WHERE t.assigned_to=? AND t.proof_uploaded_at IS NULL AND t.expired=0 AND t.verified=0", (message.from_user.id,))
-        t = c.fetchone()
-        if not t:
-            await message.answer("No pending task found. Use /gettask to receive one.")
-            return
-        await state.set_state(SubmitProofFSM.waiting_for_proof)
-        await state.update_data(task_id=t["id"])
-        await message.answer(f"Upload screen-record video as a file (not as video), as proof for: {t['title']}")
+async def submitproof_cmd(message: types.Message, state: FSMContext, user: dict | None):
+    t = user and await fetchone(SQL["open_task_of_user"], (user["id"],))
+    if not t:
+        await message.answer("No pending task found. Use /gettask to receive one.")
+        return
+    await state.set_state(SubmitProofFSM.waiting_for_proof)
+    await state.update_data(task_id=t["id"])
+    await message.answer(f"Upload screen-record video as a file (not as video), as proof for: {t['title']}")
 
 @router.message(SubmitProofFSM.waiting_for_proof)
-async def submitproof_file(message: types.Message, state: FSMContext):
+async def submitproof_file(message: types.Message, state: FSMContext, user: dict | None, tenant: Tenant):
     if not message.document:
         await message.answer("Please upload a screen-recording as a file.")
         return
     file_id = message.document.file_id
     data = await state.get_data()
     task_id = data["task_id"]
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("UPDATE tasks SET proof_file_id=?, proof_uploaded_at=? WHERE id=?",
-                  (file_id, time_now(), task_id))
-        conn.commit()
-    # Notify uploader
-    c.execute("SELECT v.user_id FROM tasks t JOIN videos v ON t.video_id=v.id WHERE t.id=?", (task_id,))
-    uploader_id = c.fetchone()["user_id"]
+    uploader_id = await submit_proof(task_id, user["id"] if user else None, file_id, time_now())
+    if uploader_id is None:
+        await state.clear()
+        await message.answer("This task is no longer open. Use /gettask to receive a new one.", reply_markup=main_menu())
+        return
+    await add_log("proof_submit", user["id"] if user else None, f"task={task_id}")
     # Store for review
     await message.answer("Proof submitted! The uploader will verify within 20 minutes.", reply_markup=main_menu())
     await state.clear()
     # Notify uploader
-    await message.bot.send_message(uploader_id, f"You have a proof to review for your video. Use /review to verify.")
+    await notifier.send(uploader_id, "You have a proof to review for your video. Use /review to verify.",
+                        coalesce_key=f"review:{tenant.id}:{uploader_id}", tenant_id=tenant.id)
 
 # /review: For uploader to verify proof
 @router.message(F.text == "/review")
-async def review_cmd(message: types.Message):
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("SELECT id FROM users WHERE tg_id=?", (message.from_user.id,))
-        u = c.fetchone()
-        if not u:
-            await message.answer("Please /start first.")
-            return
-        u = u["id"]
-        task = get_task_for_review(u)
-        if not task:
-            await message.answer("No pending proofs to review.")
-            return
-        # Send proof for review
-        kb = proof_review_kb(task["id"])
-        await message.answer_document(task["proof_file_id"], caption=f"Proof for: {task['title']}", reply_markup=kb)
+async def review_cmd(message: types.Message, user: dict | None):
+    if not user:
+        await message.answer("Please /start first.")
+        return
+    task = await get_task_for_review(user["id"])
+    if not task:
+        await message.answer("No pending proofs to review.")
+        return
+    # Send proof for review
+    kb = proof_review_kb(task["id"])
+    await message.answer_document(task["proof_file_id"], caption=f"Proof for: {task['title']}", reply_markup=kb)
+
+# /reviewall: review up to REVIEW_BATCH proofs at once
+def review_batch_state(state):
+    """The pending /reviewall batch, kept under its own FSM destiny so other flows' state.clear() leaves it alone."""
+    return FSMContext(storage=state.storage, key=replace(state.key, destiny="review_batch"))
+
+@router.message(F.text == "/reviewall")
+async def reviewall_cmd(message: types.Message, state: FSMContext, user: dict | None):
+    if not user:
+        await message.answer("Please /start first.")
+        return
+    tasks = await get_tasks_for_review(user["id"])
+    if not tasks:
+        await message.answer("No pending proofs to review.")
+        return
+    if len(tasks) == 1:
+        await message.answer_document(tasks[0]["proof_file_id"], caption=f"1. {tasks[0]['title']}")
+    else:
+        await message.answer_media_group([
+            InputMediaDocument(media=t["proof_file_id"], caption=f"{n}. {t['title']}") for n, t in enumerate(tasks, 1)
+        ])
+    task_ids = [t["id"] for t in tasks]
+    await review_batch_state(state).set_data({"review_batch": task_ids, "review_marks": {}})
+    await message.answer("Mark each proof above (numbers match the captions), then press Submit. "
+                         "Unmarked proofs stay pending.", reply_markup=review_batch_kb(task_ids, {}))
+
+@router.callback_query(F.data.startswith("rvb_"))
+async def review_batch_cb(call: types.CallbackQuery, state: FSMContext, user: dict | None, tenant: Tenant):
+    batch = review_batch_state(state)
+    data = await batch.get_data()
+    task_ids, marks = data.get("review_batch"), dict(data.get("review_marks") or {})
+    if not task_ids or not user:
+        await call.answer("This review batch has expired. Use /reviewall again.")
+        return
+    parts = call.data.split("_")
+    if parts[1] != "submit":
+        before = dict(marks)
+        if parts[1] == "rest":
+            marks.update({str(tid): "ok" for tid in task_ids if str(tid) not in marks})
+        elif int(parts[1]) in task_ids:
+            marks[parts[1]] = parts[2]
+        await batch.update_data(review_marks=marks)
+        await call.answer()
+        if marks != before:
+            await call.message.edit_reply_markup(reply_markup=review_batch_kb(task_ids, marks))
+        return
+    decisions = [(tid, marks[str(tid)] == "ok") for tid in task_ids if str(tid) in marks]
+    if not decisions:
+        await call.answer("Mark at least one proof first.")
+        return
+    results = await verify_tasks(user["id"], call.from_user.id, decisions, reject_msg="Skipped something")
+    await batch.clear()
+    for r in results:
+        result = "accepted" if r["accepted"] else "rejected"
+        await add_log("proof_verify", user["id"], f"task={r['task_id']} result={result}")
+        if r["accepted"]:
+            await notifier.send(r["viewer_tg"], "Your proof was accepted! You can now get the next task using /gettask.",
+                                tenant_id=tenant.id)
+        else:
+            await add_log("strike", r["viewer_id"], f"task={r['task_id']}")
+            await notifier.send(r["viewer_tg"], "Your proof was rejected. You received a strike. Please check requirements.",
+                                tenant_id=tenant.id)
+    accepted = sum(r["accepted"] for r in results)
+    skipped = len(decisions) - len(results)
+    await call.answer("Reviews submitted.")
+    await call.message.edit_text(f"Reviewed {len(results)} proofs: {accepted} accepted, {len(results) - accepted} rejected."
+                                 + (f"\nAlready reviewed or expired: {skipped}." if skipped else "")
+                                 + (f"\nLeft pending: {len(task_ids) - len(decisions)}." if len(decisions) < len(task_ids) else ""))
 
 @router.callback_query(F.data.startswith("verify_"))
-async def verify_cb(call: types.CallbackQuery):
+async def verify_cb(call: types.CallbackQuery, user: dict | None, tenant: Tenant):
     parts = call.data.split("_")
     task_id = int(parts[1])
-    if parts[2] == "ok":
-        mark_task_verified(task_id, "accepted", call.from_user.id)
+    uid = user["id"] if user else None
+    accepted = parts[2] == "ok"
+    viewer = await verify_task(task_id, uid, call.from_user.id, accepted,
+                               reviewer_msg=None if accepted else "Skipped something")
+    if viewer is None:
+        await call.answer("This proof was already reviewed.")
+        return
+    if accepted:
+        await add_log("proof_verify", uid, f"task={task_id} result=accepted")
         # Notify viewer: next task unlocked
-        with _db_lock:
-            conn = get_db()
-            c = conn.cursor()
-            c.execute("SELECT assigned_to FROM tasks WHERE id=?", (task_id,))
-            viewer = c.fetchone()["assigned_to"]
-        await call.bot.send_message(viewer, "Your proof was accepted! You can now get the next task using /gettask.")
+        await notifier.send(viewer["viewer_tg"], "Your proof was accepted! You can now get the next task using /gettask.",
+                            tenant_id=tenant.id)
         await call.answer("Proof accepted.")
-        await call.message.edit_text("Proof accepted.", reply_markup=main_menu())
+        await call.message.edit_text("Proof accepted.")
     else:
-        mark_task_verified(task_id, "rejected", call.from_user.id, reviewer_msg="Skipped something")
-        with _db_lock:
-            conn = get_db()
-            c = conn.cursor()
-            c.execute("SELECT assigned_to FROM tasks WHERE id=?", (task_id,))
-            viewer = c.fetchone()["assigned_to"]
-        increment_strike(viewer)
-        await call.bot.send_message(viewer, "Your proof was rejected. You received a strike. Please check requirements.")
+        await add_log("proof_verify", uid, f"task={task_id} result=rejected")
+        await add_log("strike", viewer["viewer_id"], f"task={task_id}")
+        await notifier.send(viewer["viewer_tg"], "Your proof was rejected. You received a strike. Please check requirements.",
+                            tenant_id=tenant.id)
         await call.answer("Proof rejected and strike added.")
-        await call.message.edit_text("Proof rejected.", reply_markup=main_menu())
-        reset_task_after_rejection(task_id)
+        await call.message.edit_text("Proof rejected.")
 
 # /strikes
 @router.message(F.text == "/strikes")
-async def strikes_cmd(message: types.Message):
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("SELECT strikes FROM users WHERE tg_id=?", (message.from_user.id,))
-        s = c.fetchone()
-        strikes = s["strikes"] if s else 0
+async def strikes_cmd(message: types.Message, user: dict | None):
+    strikes = user["strikes"] if user else 0
     await message.answer(f"Your strikes: {strikes} (4 = ban).")
 
 # /status
 @router.message(F.text == "/status")
-async def status_cmd(message: types.Message):
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("SELECT paused, strikes FROM users WHERE tg_id=?", (message.from_user.id,))
-        u = c.fetchone()
-        if not u:
-            await message.answer("Please /start first.")
-            return
-        c.execute("SELECT COUNT(*) as cnt FROM videos WHERE user_id=? AND active=1", (message.from_user.id,))
-        v = c.fetchone()
-    await message.answer(f"Paused: {'Yes' if u['paused'] else 'No'}\nStrikes: {u['strikes']}\nActive videos: {v['cnt']}")
\ No newline at end of file
+async def status_cmd(message: types.Message, user: dict | None):
+    u = user
+    if not u:
+        await message.answer("Please /start first.")
+        return
+    v = await fetchone(SQL["count_active_videos"], (u["id"],))
+    s = await fetchone(SQL["user_stats"], (u["id"],))
+    c = await fetchone(SQL["user_credits"], (u["id"],))
+    done = f"{s['proofs']} (accepted {s['accepted']}, rejected {s['rejected']})" if s else "0"
+    given, received = (c["given"], c["received"]) if c else (0, 0)
+    await message.answer(f"Paused: {'Yes' if u['paused'] else 'No'}\nStrikes: {u['strikes']}\nActive videos: {v['cnt']}\n"
+                         f"Tasks completed: {done}\n"
+                         f"Views given: {given}, received: {received} (credit {given - received:+d})")
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""Drive the real dispatcher with simulated users and report per-command latency.
+
+    python loadtest.py --users 200 --videos 2 --rounds 5 --review-rate 0.8
+
+Every update goes through main.build_dispatcher against a temporary SQLite
+file; outgoing Telegram calls are recorded by a stub Bot instead of sent.
+Per-user throttling is off unless --throttle is given, since simulated users
+send far faster than real ones and throttled updates would be measured as
+near-free no-ops.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from aiogram import Bot
+from aiogram.methods import SendPhoto, SendDocument
+from aiogram.types import Update, Message, CallbackQuery, Chat, User, PhotoSize, Document
+import db
+from tenants import DEFAULT_TENANT
+
+class StubBot(Bot):
+    """Bot that records every API call per chat and never touches the network."""
+
+    def __init__(self):
+        super().__init__(token="42:loadtest")
+        self.calls = defaultdict(list)
+        self.total_calls = 0
+
+    async def __call__(self, method, request_timeout=None):
+        self.calls[getattr(method, "chat_id", None)].append(method)
+        self.total_calls += 1
+        return True
+
+class SimUser:
+    def __init__(self, sim, tg_id):
+        self.sim = sim
+        self.tg_id = tg_id
+        self.user = User(id=tg_id, is_bot=False, first_name=f"user{tg_id}", username=f"user{tg_id}")
+        self.chat = Chat(id=tg_id, type="private")
+
+    def _message(self, **fields):
+        return Message(message_id=self.sim.next_id(), date=datetime.now(), chat=self.chat, from_user=self.user, **fields)
+
+    async def send(self, name, **fields):
+        return await self.sim.feed(name, self.tg_id, Update(update_id=self.sim.next_id(), message=self._message(**fields)))
+
+    async def press(self, name, data):
+        call = CallbackQuery(id=str(self.sim.next_id()), from_user=self.user, chat_instance="sim",
+                             data=data, message=self._message(text="button"))
+        return await self.sim.feed(name, self.tg_id, Update(update_id=self.sim.next_id(), callback_query=call))
+
+    def _button(self, calls, method_type):
+        for method in reversed(calls):
+            if isinstance(method, method_type) and method.reply_markup:
+                return method.reply_markup.inline_keyboard
+        return None
+
+    async def run(self, args):
+        rnd = self.sim.random
+        await self.send("/start", text="/start")
+        for i in range(args.videos):
+            await self.send("/upload", text="/upload")
+            await self.send("upload_title", text=f"video {self.tg_id}-{i}")
+            await self.send("upload_thumbnail", photo=[PhotoSize(file_id=f"thumb{self.tg_id}-{i}", file_unique_id=f"t{self.tg_id}-{i}", width=320, height=180)])
+            await self.send("upload_duration", text=str(rnd.randint(30, 300)))
+            await self.send("upload_link", text="skip")
+        for _ in range(args.rounds):
+            if rnd.random() < args.review_rate:
+                calls = await self.send("/review", text="/review")
+                kb = self._button(calls, SendDocument)
+                if kb:
+                    ok = rnd.random() >= args.reject_rate
+                    await self.press("verify", kb[1 - ok][0].callback_data)
+            calls = await self.send("/gettask", text="/gettask")
+            kb = self._button(calls, SendPhoto)
+            if not kb:
+                continue
+            await self.press("accept", kb[0][0].callback_data)
+            await self.send("/submitproof", text="/submitproof")
+            await self.send("proof", document=Document(file_id=f"proof{self.sim.next_id()}", file_unique_id=f"p{self.tg_id}"))
+
+class Simulation:
+    def __init__(self, dp, bot, seed=0):
+        self.dp = dp
+        self.bot = bot
+        self.random = random.Random(seed)
+        self.latencies = defaultdict(list)
+        self._id = 0
+
+    def next_id(self):
+        self._id += 1
+        return self._id
+
+    async def feed(self, name, chat_id, update):
+        """Feed one update; returns the API calls it produced for that chat."""
+        before = len(self.bot.calls[chat_id])
+        start = time.perf_counter()
+        await self.dp.feed_update(self.bot, update)
+        self.latencies[name].append(time.perf_counter() - start)
+        return self.bot.calls[chat_id][before:]
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def report(latencies, elapsed):
+    total = sum(len(v) for v in latencies.values())
+    result = {"updates": total, "seconds": round(elapsed, 3), "updates_per_sec": round(total / elapsed, 1), "commands": {}}
+    for name, values in sorted(latencies.items()):
+        result["commands"][name] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+        }
+    return result
+
+def print_report(result):
+    print(f"{result['updates']} updates in {result['seconds']}s ({result['updates_per_sec']}/s)")
+    print(f"{'command':<18}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, r in result["commands"].items():
+        print(f"{name:<18}{r['count']:>8}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+
+async def run(args):
+    import main
+    from middlewares import THROTTLE_RATES
+    from storage import SQLiteStorage
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "loadtest.db")
+        bot = StubBot()
+        storage = SQLiteStorage()
+        dp = main.build_dispatcher(storage, THROTTLE_RATES if args.throttle else None)
+        await main.start_services({DEFAULT_TENANT: bot})
+        try:
+            sim = Simulation(dp, bot, args.seed)
+            users = [SimUser(sim, 100000 + i) for i in range(args.users)]
+            start = time.perf_counter()
+            await asyncio.gather(*(u.run(args) for u in users))
+            elapsed = time.perf_counter() - start
+        finally:
+            await main.stop_services(storage)
+    return report(sim.latencies, elapsed)
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--users", type=int, default=100)
+    p.add_argument("--videos", type=int, default=2, help="videos uploaded per user (max 5)")
+    p.add_argument("--rounds", type=int, default=5, help="gettask/review rounds per user")
+    p.add_argument("--review-rate", type=float, default=0.8, help="chance a user checks /review each round")
+    p.add_argument("--reject-rate", type=float, default=0.1, help="chance a reviewed proof is rejected")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--throttle", action="store_true", help="keep the per-user throttle on")
+    p.add_argument("--json", action="store_true", help="print the report as JSON")
+    return p.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
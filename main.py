@@ -1,26 +1,86 @@
 import asyncio
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
-from db import init_db, remove_expired_tasks_and_proofs
+from aiogram.client.session.aiohttp import AiohttpSession
+from db import init_db, open_pool, close_pool, log_writer
 from handlers import router as user_router
 from admin import router as admin_router
-from utils import get_token
+from metrics import MetricsMiddleware, ApiMetricsMiddleware, start_metrics_server
+from middlewares import THROTTLE_RATES, ThrottleMiddleware, UserMiddleware
+from notify import notifier
+from retention import run_retention
+from scheduler import expiry_scheduler
+from storage import SQLiteStorage
+from tasks import load_video_index
+from tenants import load_tenants, register_tenants
+from updates import update_scheduler
+from utils import get_mode, get_webhook_config, get_metrics_port
+from webhook import run_webhook
 
-async def daily_cleanup():
-    from asyncio import sleep
-    while True:
-        remove_expired_tasks_and_proofs()
-        await sleep(24*60*60)  # Run every 24h
+background_tasks = []
 
-async def main():
-    init_db()
-    bot = Bot(token=get_token())
-    dp = Dispatcher(storage=MemoryStorage())
+def build_dispatcher(storage, throttle_rates=THROTTLE_RATES):
+    """`throttle_rates=None` turns per-user throttling off (load tests)."""
+    # FSM is registered by hand so the scheduler queues updates before their state is read.
+    dp = Dispatcher(storage=storage, disable_fsm=True)
+    dp.update.outer_middleware(update_scheduler)
+    dp.update.outer_middleware(dp.fsm)
+    if throttle_rates is not None:
+        throttle = ThrottleMiddleware(throttle_rates)
+        dp.message.outer_middleware(throttle)
+        dp.callback_query.outer_middleware(throttle)
+    dp.message.outer_middleware(UserMiddleware())
+    dp.callback_query.outer_middleware(UserMiddleware())
+    dp.message.middleware(MetricsMiddleware())
+    dp.callback_query.middleware(MetricsMiddleware())
     dp.include_router(user_router)
     dp.include_router(admin_router)
-    # Start daily cleanup
-    asyncio.create_task(daily_cleanup())
-    await dp.start_polling(bot)
+    return dp
+
+async def start_services(bots):
+    """`bots` maps tenant id -> Bot."""
+    init_db()
+    open_pool()
+    await load_video_index()
+    log_writer.start()
+    update_scheduler.start()
+    # Start deadline-driven expiry
+    await expiry_scheduler.start()
+    notifier.start(bots)
+    background_tasks.append(asyncio.create_task(run_retention()))
+
+async def stop_services(storage):
+    await update_scheduler.stop()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    await expiry_scheduler.stop()
+    await notifier.stop()
+    await storage.close()
+    await log_writer.stop()
+    close_pool()
+
+async def main():
+    tenants = load_tenants()
+    register_tenants(tenants)
+    # Every bot shares one HTTP session (and connection pool); the dispatcher tells them apart by bot id.
+    session = AiohttpSession()
+    session.middleware(ApiMetricsMiddleware())
+    bots = {t.id: Bot(token=t.token, session=session) for t in tenants}
+    storage = SQLiteStorage()
+    dp = build_dispatcher(storage)
+    await start_services(bots)
+    metrics_runner = await start_metrics_server(port=get_metrics_port()) if get_metrics_port() else None
+    try:
+        if get_mode() == "webhook":
+            await run_webhook(dp, bots, **get_webhook_config())
+        else:
+            await dp.start_polling(*bots.values())
+    finally:
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await stop_services(storage)
+        await session.close()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,136 @@
+import heapq
+from queries import SQL
+from tenants import DEFAULT_TENANT
+
+# An owner's credit balance (views given - views received) moves their videos
+# up the queue by up to CREDIT_CAP views, so users who give more get seen sooner.
+CREDIT_CAP = 10
+# Heap entries next_for may set aside as owned/already assigned before it falls
+# back to one pass over the tenant's unassigned videos instead.
+LOOKAHEAD = 32
+
+class VideoIndex:
+    """In-memory view counts for active videos, ordered by a lazy min-heap per tenant.
+
+    Heap entries are (views - owner credit, video_id); an entry is stale once
+    the video is removed or its key has moved on, and stale entries are dropped
+    as they surface. Ties go to the lowest video id. Users only ever get
+    videos from their own tenant's heap.
+
+    A user's assigned videos stay in the shared heap, so next_for skips them:
+    at most LOOKAHEAD of them, O(LOOKAHEAD log n). A heavy viewer who has been
+    assigned every top-ranked video instead gets a set difference over the
+    tenant's videos (in C) and a min over the videos still open to them, so the
+    worst case is O(n) with a small constant rather than O(assigned log n)
+    heap pops and pushes per call (bench.py: get_next_video_heavy_viewer).
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self._heaps = {}
+        self._views = {}
+        self._owner = {}
+        self._tenant = {}
+        self._members = {}
+        self._videos_of = {}
+        self._credit = {}
+        self._assigned = {}
+
+    def load(self, conn):
+        owner, tenant, views, videos_of, credit, assigned = {}, {}, {}, {}, {}, {}
+        for row in conn.execute(SQL["index_videos"]):
+            owner[row["id"]] = row["user_id"]
+            tenant[row["id"]] = row["tenant_id"]
+            videos_of.setdefault(row["user_id"], set()).add(row["id"])
+            views[row["id"]] = 0
+        for row in conn.execute(SQL["index_views"]):
+            if row["video_id"] in views:
+                views[row["video_id"]] = row["cnt"]
+        for row in conn.execute(SQL["index_credits"]):
+            credit[row["user_id"]] = row["balance"]
+        for row in conn.execute(SQL["index_assignments"]):
+            assigned.setdefault(row["assigned_to"], set()).add(row["video_id"])
+        self._owner, self._tenant, self._views = owner, tenant, views
+        self._videos_of, self._credit, self._assigned = videos_of, credit, assigned
+        self._members = {}
+        for vid, t in tenant.items():
+            self._members.setdefault(t, set()).add(vid)
+        self._heaps = {}
+        for t in self._members:
+            self._rebuild(t)
+        self.loaded = True
+
+    def _key(self, video_id):
+        balance = self._credit.get(self._owner[video_id], 0)
+        return self._views[video_id] - max(-CREDIT_CAP, min(CREDIT_CAP, balance))
+
+    def _rebuild(self, tenant_id):
+        heap = self._heaps[tenant_id] = [(self._key(vid), vid) for vid in self._members.get(tenant_id, ())]
+        heapq.heapify(heap)
+
+    def _push(self, video_id):
+        tenant_id = self._tenant[video_id]
+        heap = self._heaps.setdefault(tenant_id, [])
+        heapq.heappush(heap, (self._key(video_id), video_id))
+        if len(heap) > 4 * len(self._views) + 64:
+            # Mostly stale entries: rebuild rather than let the heap grow unbounded.
+            self._rebuild(tenant_id)
+
+    def add_video(self, video_id, owner_id, tenant_id=DEFAULT_TENANT):
+        self._owner[video_id] = owner_id
+        self._tenant[video_id] = tenant_id
+        self._members.setdefault(tenant_id, set()).add(video_id)
+        self._videos_of.setdefault(owner_id, set()).add(video_id)
+        self._views[video_id] = 0
+        self._push(video_id)
+
+    def remove_video(self, video_id):
+        owner = self._owner.pop(video_id, None)
+        self._members.get(self._tenant.pop(video_id, None), set()).discard(video_id)
+        self._videos_of.get(owner, set()).discard(video_id)
+        self._views.pop(video_id, None)
+
+    def record_view(self, video_id):
+        if video_id in self._views:
+            self._views[video_id] += 1
+            self._push(video_id)
+
+    def record_assignment(self, video_id, user_id):
+        self._assigned.setdefault(user_id, set()).add(video_id)
+
+    def record_credit(self, viewer_id, owner_id):
+        """An accepted view moves one credit from the owner to the viewer."""
+        for user_id, delta in ((viewer_id, 1), (owner_id, -1)):
+            videos = self._videos_of.get(user_id, ())
+            before = [self._key(vid) for vid in videos]
+            self._credit[user_id] = self._credit.get(user_id, 0) + delta
+            for vid, old in zip(videos, before):
+                if self._key(vid) != old:
+                    self._push(vid)
+
+    def next_for(self, user_id, tenant_id=DEFAULT_TENANT):
+        """Return the best-ranked active video of the tenant that the user doesn't own and hasn't been assigned."""
+        heap = self._heaps.get(tenant_id, [])
+        seen = self._assigned.get(user_id, ())
+        skipped = []
+        found = None
+        while heap and len(skipped) < LOOKAHEAD:
+            key, vid = heapq.heappop(heap)
+            if vid not in self._views or self._key(vid) != key:
+                continue
+            skipped.append((key, vid))
+            if self._owner[vid] != user_id and vid not in seen:
+                found = vid
+                break
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+        if found is None and len(skipped) == LOOKAHEAD:
+            found = self._scan(user_id, tenant_id)
+        return found
+
+    def _scan(self, user_id, tenant_id):
+        """next_for by one pass over the tenant's videos the user neither owns nor has been assigned."""
+        open_ = self._members.get(tenant_id, set()) - self._assigned.get(user_id, set()) - self._videos_of.get(user_id, set())
+        return min(open_, key=lambda vid: (self._key(vid), vid), default=None)
+
+video_index = VideoIndex()
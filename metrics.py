@@ -0,0 +1,226 @@
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from functools import lru_cache
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from tenants import tenant_for
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "bot_handler_seconds": "Time spent in each update handler.",
+    "bot_db_query_seconds": "Time spent executing each SQL statement.",
+    "bot_db_lock_wait_seconds": "Time waiting for a pooled connection (write = the single writer).",
+    "bot_db_lock_hold_seconds": "Time a pooled connection was held.",
+    "bot_api_seconds": "Time spent in each Telegram Bot API call.",
+    "bot_update_wait_seconds": "Time an update waited in its scheduler lane before a worker took it.",
+    "bot_update_queue_depth": "Updates waiting in each scheduler lane.",
+    "bot_tenant_handler_seconds": "Handler time per tenant (one observation per handled update).",
+    "bot_tenant_db_seconds": "Pooled DB connection time per tenant; background jobs are tenant=\"background\".",
+    "bot_tenant_api_seconds": "Telegram Bot API call time per tenant.",
+}
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.buckets[bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation."""
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS + (float("inf"),), self.buckets):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+class Registry:
+    """Thread-safe set of labelled histograms and gauges; observed from handlers and DB worker threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._gauges = {}
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._series.get(key)
+            if hist is None:
+                hist = self._series[key] = Histogram()
+            hist.observe(value)
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def gauges(self, name):
+        """[(labels dict, value)] for one gauge."""
+        with self._lock:
+            return [(dict(labels), v) for (n, labels), v in self._gauges.items() if n == name]
+
+    def series(self, name):
+        """[(labels dict, Histogram)] for one metric."""
+        with self._lock:
+            return [(dict(labels), hist) for (n, labels), hist in self._series.items() if n == name]
+
+    def render(self):
+        """Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            items = sorted(self._series.items())
+            gauges = sorted(self._gauges.items())
+        current = None
+        for (name, labels), hist in items:
+            if name != current:
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                current = name
+            label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            sep = "," if label_str else ""
+            cumulative = 0
+            for bound, n in zip(BUCKETS + (float("inf"),), hist.buckets):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{name}_bucket{{{label_str}{sep}le="{le}"}} {cumulative}')
+            suffix = f"{{{label_str}}}" if label_str else ""
+            lines.append(f"{name}_sum{suffix} {hist.sum}")
+            lines.append(f"{name}_count{suffix} {hist.count}")
+        current = None
+        for (name, labels), value in gauges:
+            if name != current:
+                lines.append(f"# HELP {name} {HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} gauge")
+                current = name
+            label_str = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{name}{{{label_str}}} {value}" if label_str else f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+registry = Registry()
+
+@lru_cache(maxsize=1024)
+def statement_label(sql):
+    return " ".join(sql.split())[:80]
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            registry.observe("bot_db_query_seconds", time.perf_counter() - start, statement=statement_label(sql))
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection factory that times every statement it runs."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq)
+        finally:
+            registry.observe("bot_db_query_seconds", time.perf_counter() - start, statement=statement_label(sql))
+
+class MetricsMiddleware(BaseMiddleware):
+    """Records handler latency, labelled by the handler function's name.
+
+    Register it as an inner middleware (dp.message.middleware(...)) so the
+    resolved handler is known.
+    """
+
+    async def __call__(self, handler, event, data):
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = time.perf_counter() - start
+            obj = data.get("handler")
+            name = obj.callback.__name__ if obj is not None else type(event).__name__
+            registry.observe("bot_handler_seconds", elapsed, handler=name)
+            tenant = data.get("tenant")
+            if tenant is not None:
+                registry.observe("bot_tenant_handler_seconds", elapsed, tenant=str(tenant.id))
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    """Bot session hook timing each Telegram API call by method and by the calling bot's tenant."""
+
+    async def __call__(self, make_request, bot, method):
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            elapsed = time.perf_counter() - start
+            registry.observe("bot_api_seconds", elapsed, method=method.__api_method__)
+            registry.observe("bot_tenant_api_seconds", elapsed, tenant=str(tenant_for(bot).id))
+
+async def start_metrics_server(host="127.0.0.1", port=9100):
+    """Serve GET /metrics; returns the aiohttp runner so the caller can clean it up."""
+    async def handle(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+def summary(limit=8):
+    """Short text digest for /adminstats."""
+    def section(title, name, label):
+        rows = sorted(registry.series(name), key=lambda s: -s[1].sum)[:limit]
+        if not rows:
+            return [f"{title}: no data"]
+        out = [f"{title}:"]
+        for labels, h in rows:
+            out.append(f"- {labels.get(label, '')[:40]}: n={h.count} avg={h.sum / h.count * 1000:.1f}ms "
+                       f"p95<={h.quantile(0.95) * 1000:.1f}ms")
+        return out
+    lines = []
+    lines += section("Handlers", "bot_handler_seconds", "handler")
+    lines += section("DB connection wait", "bot_db_lock_wait_seconds", "mode")
+    lines += section("DB connection hold", "bot_db_lock_hold_seconds", "mode")
+    lines += section("Slowest statements (total time)", "bot_db_query_seconds", "statement")
+    lines += section("Telegram API", "bot_api_seconds", "method")
+    lines += section("Update lane wait", "bot_update_wait_seconds", "lane")
+    lines += tenant_usage()
+    depth = registry.gauges("bot_update_queue_depth")
+    if depth:
+        lines.append("Queued updates: " + ", ".join(f"{labels['lane']}={int(v)}" for labels, v in depth))
+    return "\n".join(lines)
+
+def tenant_usage():
+    """Per-tenant resource accounting lines for /adminstats: updates handled, handler, DB and API time."""
+    usage = {}
+    def row(labels):
+        return usage.setdefault(labels["tenant"], {"updates": 0, "handler": 0.0, "db": 0.0, "calls": 0, "api": 0.0})
+    for labels, h in registry.series("bot_tenant_handler_seconds"):
+        row(labels).update(updates=h.count, handler=h.sum)
+    for labels, h in registry.series("bot_tenant_db_seconds"):
+        row(labels)["db"] = h.sum
+    for labels, h in registry.series("bot_tenant_api_seconds"):
+        row(labels).update(calls=h.count, api=h.sum)
+    if not usage:
+        return ["Tenants: no data"]
+    out = ["Tenants:"]
+    for tenant, u in sorted(usage.items()):
+        out.append(f"- {tenant}: updates={u['updates']} handler={u['handler']:.1f}s db={u['db']:.1f}s "
+                   f"api={u['calls']} calls/{u['api']:.1f}s")
+    return out
@@ -0,0 +1,104 @@
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery
+from cache import TTLCache, user_cache
+from db import fetchone, execute
+from queries import SQL
+from tenants import current_tenant, tenant_for
+from utils import TokenBucket, time_now, SECOND_MS
+
+LAST_ACTIVE_RESOLUTION = 5 * 60 * SECOND_MS  # users.last_active is refreshed at most this often
+
+async def load_user(tg_id, tenant_id):
+    """Return the cached identity/eligibility record for a Telegram user of one tenant, or None."""
+    sentinel = object()
+    user = user_cache.get((tenant_id, tg_id), sentinel)
+    if user is sentinel:
+        row = await fetchone(SQL["user_by_tg"], (tenant_id, tg_id))
+        user = dict(row) if row else None
+        user_cache.set((tenant_id, tg_id), user)
+    return user
+
+async def touch_user(user):
+    """Keep users.last_active current to within LAST_ACTIVE_RESOLUTION, writing at most that often."""
+    now = time_now()
+    if (user["last_active"] or 0) < now - LAST_ACTIVE_RESOLUTION:
+        user["last_active"] = now  # the cached record, so concurrent updates don't write again
+        await execute(SQL["touch_user"], (now, user["id"]))
+
+class UserMiddleware(BaseMiddleware):
+    """Injects `tenant` (the Tenant of the receiving bot) and `user` (see load_user) into handler kwargs."""
+
+    async def __call__(self, handler, event, data):
+        tenant = data["tenant"] = tenant_for(data["bot"])
+        token = current_tenant.set(tenant.id)
+        try:
+            from_user = data.get("event_from_user")
+            data["user"] = user = await load_user(from_user.id, tenant.id) if from_user else None
+            if user:
+                await touch_user(user)
+            return await handler(event, data)
+        finally:
+            current_tenant.reset(token)
+
+# command class -> (tokens per second, burst)
+THROTTLE_RATES = {
+    "task": (0.2, 3),          # /gettask, accept/skip buttons
+    "review": (1, 5),          # /review, verify buttons
+    "review_batch": (2, 25),   # /reviewall marks and Submit: a full batch is 11+ taps
+    "default": (1, 5),
+}
+COMMAND_CLASSES = {
+    "/gettask": "task", "accepttask": "task",
+    "/review": "review", "/reviewall": "review", "verify": "review", "rvb": "review_batch",
+}
+# Idempotent toggles kept in FSM data: repeating one is a real change of mind, not a double tap.
+DEDUPE_EXEMPT = {"review_batch"}
+CALLBACK_DEDUPE_SECONDS = 10
+
+def command_class(event):
+    if isinstance(event, CallbackQuery):
+        key = (event.data or "").split("_", 1)[0]
+    else:
+        key = (event.text or "").split(maxsplit=1)[0] if event.text else ""
+    return COMMAND_CLASSES.get(key, "default")
+
+class ThrottleMiddleware(BaseMiddleware):
+    """Per-user token buckets per bot and command class, plus suppression of repeated button taps.
+
+    Register it as the first outer middleware so throttled updates never reach
+    the user lookup or the handlers. Throttled callbacks get a "too fast" answer;
+    throttled messages are dropped. Non-command messages that continue an active
+    FSM step (title, thumbnail, proof document, ...) are never throttled, so an
+    upload or proof is not silently thrown away.
+    """
+
+    def __init__(self, rates=THROTTLE_RATES, dedupe_seconds=CALLBACK_DEDUPE_SECONDS):
+        self.rates = rates
+        self._buckets = TTLCache(maxsize=50000, ttl=60)
+        self._seen = TTLCache(maxsize=50000, ttl=dedupe_seconds)
+
+    async def __call__(self, handler, event, data):
+        from_user = data.get("event_from_user")
+        if from_user is None:
+            return await handler(event, data)
+        if not isinstance(event, CallbackQuery) and data.get("raw_state") and not (event.text or "").startswith("/"):
+            return await handler(event, data)
+        bot_id = data["bot"].id
+        cls = command_class(event)
+        key = None
+        if isinstance(event, CallbackQuery) and event.message is not None and cls not in DEDUPE_EXEMPT:
+            key = (bot_id, event.message.chat.id, event.message.message_id, event.data)
+            if self._seen.get(key):
+                await event.answer()
+                return None
+        bucket = self._buckets.get((bot_id, from_user.id, cls))
+        if bucket is None:
+            bucket = TokenBucket(*self.rates[cls])
+            self._buckets.set((bot_id, from_user.id, cls), bucket)
+        if not bucket.consume():
+            if isinstance(event, CallbackQuery):
+                await event.answer("Too fast, please wait a moment.")
+            return None
+        if key is not None:
+            self._seen.set(key, True)
+        return await handler(event, data)
@@ -0,0 +1,262 @@
+"""Ordered schema migrations, tracked with SQLite's PRAGMA user_version.
+
+Each entry is applied in its own transaction together with the version bump,
+so a crash mid-upgrade leaves the DB at the last fully applied version.
+An entry may instead be a function for data migrations too large for one
+transaction; it commits its own batches and must be safe to rerun.
+Append new migrations to the end of MIGRATIONS; never edit shipped ones.
+"""
+
+MIGRATION_BATCH = 5000
+
+# table -> timestamp columns converted from ISO-8601 text to epoch milliseconds
+TIMESTAMP_COLUMNS = {
+    "users": ("last_active", "banned_until"),
+    "videos": ("uploaded_at",),
+    "tasks": ("assigned_at", "proof_uploaded_at", "verification_at"),
+    "logs": ("created_at",),
+    "notifications": ("created_at",),
+}
+
+def _iso_to_ms(col):
+    return (f"CAST(strftime('%s', {col}) AS INTEGER) * 1000 "
+            f"+ CAST(substr(strftime('%f', {col}), 4) AS INTEGER)")
+
+def epoch_ms_timestamps(conn, batch=MIGRATION_BATCH):
+    """Rewrite text timestamps as INTEGER epoch ms, `batch` rows per transaction.
+
+    Only rows still holding text are touched, so an interrupted run resumes
+    where it stopped. Declared TIMESTAMP columns have NUMERIC affinity and
+    keep the integers as integers, so no table rebuild is needed.
+    """
+    for table, cols in TIMESTAMP_COLUMNS.items():
+        sets = ", ".join(f"{c} = CASE WHEN typeof({c}) = 'text' THEN {_iso_to_ms(c)} ELSE {c} END" for c in cols)
+        pending = " OR ".join(f"typeof({c}) = 'text'" for c in cols)
+        first = conn.execute(f"SELECT MIN(id) FROM {table} WHERE {pending}").fetchone()[0]
+        last = conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0]
+        if first is None:
+            continue
+        for lo in range(first, last + 1, batch):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(f"UPDATE {table} SET {sets} WHERE id BETWEEN ? AND ? AND ({pending})",
+                             (lo, lo + batch - 1))
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
+
+MIGRATIONS = [
+    # 1: indexes for the hot task/video filters
+    [
+        "CREATE INDEX IF NOT EXISTS idx_tasks_assigned_to ON tasks (assigned_to, video_id)",
+        "CREATE INDEX IF NOT EXISTS idx_tasks_video_proof ON tasks (video_id, proof_uploaded_at)",
+        "CREATE INDEX IF NOT EXISTS idx_videos_user_active ON videos (user_id, active)",
+    ],
+    # 2: partial index over proofs still waiting for review
+    [
+        """CREATE INDEX IF NOT EXISTS idx_tasks_pending_review ON tasks (proof_uploaded_at, video_id)
+           WHERE proof_uploaded_at IS NOT NULL AND verified=0 AND expired=0""",
+    ],
+    # 3: outbound notification queue
+    [
+        """CREATE TABLE IF NOT EXISTS notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER,
+            text TEXT,
+            coalesce_key TEXT,
+            attempts INTEGER DEFAULT 0,
+            created_at TIMESTAMP
+        )""",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_notifications_coalesce ON notifications (coalesce_key) WHERE coalesce_key IS NOT NULL",
+    ],
+    # 4: persistent FSM state
+    [
+        """CREATE TABLE IF NOT EXISTS fsm_states (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            updated_at REAL
+        )""",
+        "CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_at)",
+    ],
+    # 5: deadline sources for the expiry scheduler
+    [
+        """CREATE INDEX IF NOT EXISTS idx_tasks_open_assignments ON tasks (assigned_at)
+           WHERE proof_uploaded_at IS NULL AND verified=0 AND expired=0""",
+        "CREATE INDEX IF NOT EXISTS idx_users_banned_until ON users (banned_until) WHERE banned_until IS NOT NULL",
+    ],
+    # 6: keyset pagination for the admin panel
+    [
+        "CREATE INDEX IF NOT EXISTS idx_users_strikes ON users (strikes, id)",
+    ],
+    # 7: analytics rollups (see rollups.py), backfilled once from tasks
+    [
+        """CREATE TABLE IF NOT EXISTS daily_stats (
+            day TEXT,
+            metric TEXT,
+            value INTEGER DEFAULT 0,
+            PRIMARY KEY (day, metric)
+        )""",
+        """CREATE TABLE IF NOT EXISTS video_stats (
+            video_id INTEGER PRIMARY KEY,
+            assigned INTEGER DEFAULT 0,
+            proofs INTEGER DEFAULT 0,
+            accepted INTEGER DEFAULT 0,
+            rejected INTEGER DEFAULT 0
+        )""",
+        """CREATE TABLE IF NOT EXISTS user_stats (
+            user_id INTEGER PRIMARY KEY,
+            assigned INTEGER DEFAULT 0,
+            proofs INTEGER DEFAULT 0,
+            accepted INTEGER DEFAULT 0,
+            rejected INTEGER DEFAULT 0,
+            strikes INTEGER DEFAULT 0,
+            reviews INTEGER DEFAULT 0,
+            review_seconds INTEGER DEFAULT 0
+        )""",
+        """INSERT INTO daily_stats (day, metric, value)
+           SELECT substr(assigned_at, 1, 10), 'assigned', COUNT(*) FROM tasks
+           WHERE assigned_at IS NOT NULL GROUP BY 1
+           UNION ALL
+           SELECT substr(proof_uploaded_at, 1, 10), 'proofs', COUNT(*) FROM tasks
+           WHERE proof_uploaded_at IS NOT NULL GROUP BY 1
+           UNION ALL
+           SELECT substr(verification_at, 1, 10), verification_result, COUNT(*) FROM tasks
+           WHERE verified=1 AND verification_result IN ('accepted', 'rejected') GROUP BY 1, 2
+           UNION ALL
+           SELECT substr(verification_at, 1, 10), 'reviews', COUNT(*) FROM tasks
+           WHERE verified=1 AND proof_uploaded_at IS NOT NULL GROUP BY 1
+           UNION ALL
+           SELECT substr(verification_at, 1, 10), 'review_seconds',
+                  CAST(SUM((julianday(verification_at) - julianday(proof_uploaded_at)) * 86400) AS INTEGER)
+           FROM tasks WHERE verified=1 AND proof_uploaded_at IS NOT NULL GROUP BY 1""",
+        """INSERT INTO video_stats (video_id, assigned, proofs, accepted, rejected)
+           SELECT video_id, COUNT(*), COUNT(proof_uploaded_at),
+                  COUNT(CASE WHEN verification_result = 'accepted' THEN 1 END),
+                  COUNT(CASE WHEN verification_result = 'rejected' THEN 1 END)
+           FROM tasks GROUP BY video_id""",
+        """INSERT INTO user_stats (user_id, assigned, proofs, accepted, rejected)
+           SELECT assigned_to, COUNT(*), COUNT(proof_uploaded_at),
+                  COUNT(CASE WHEN verification_result = 'accepted' THEN 1 END),
+                  COUNT(CASE WHEN verification_result = 'rejected' THEN 1 END)
+           FROM tasks GROUP BY assigned_to""",
+        """INSERT INTO user_stats (user_id, reviews, review_seconds)
+           SELECT v.user_id, COUNT(*),
+                  CAST(SUM((julianday(t.verification_at) - julianday(t.proof_uploaded_at)) * 86400) AS INTEGER)
+           FROM tasks t JOIN videos v ON t.video_id = v.id
+           WHERE t.verified=1 AND t.proof_uploaded_at IS NOT NULL GROUP BY v.user_id
+           ON CONFLICT (user_id) DO UPDATE SET reviews = excluded.reviews, review_seconds = excluded.review_seconds""",
+    ],
+    # 8: reciprocity ledger, views given vs received (accepted proofs only)
+    [
+        """CREATE TABLE IF NOT EXISTS user_credits (
+            user_id INTEGER PRIMARY KEY,
+            given INTEGER DEFAULT 0,
+            received INTEGER DEFAULT 0,
+            rejected INTEGER DEFAULT 0
+        )""",
+        """INSERT INTO user_credits (user_id, given, rejected)
+           SELECT assigned_to,
+                  COUNT(CASE WHEN verification_result = 'accepted' THEN 1 END),
+                  COUNT(CASE WHEN verification_result = 'rejected' THEN 1 END)
+           FROM tasks WHERE verified=1 GROUP BY assigned_to""",
+        """INSERT INTO user_credits (user_id, received)
+           SELECT v.user_id, COUNT(*) FROM tasks t JOIN videos v ON t.video_id = v.id
+           WHERE t.verification_result = 'accepted' GROUP BY v.user_id
+           ON CONFLICT (user_id) DO UPDATE SET received = excluded.received""",
+    ],
+    # 9: ISO-8601 text timestamps -> INTEGER epoch milliseconds
+    epoch_ms_timestamps,
+    # 10: multi-bot hosting (see tenants.py); existing rows belong to tenant 0.
+    # users is rebuilt because tg_id is only unique within a tenant now.
+    [
+        """CREATE TABLE users_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tenant_id INTEGER NOT NULL DEFAULT 0,
+            tg_id INTEGER,
+            username TEXT,
+            strikes INTEGER DEFAULT 0,
+            paused INTEGER DEFAULT 0,
+            last_active INTEGER,
+            banned_until INTEGER,
+            UNIQUE (tenant_id, tg_id)
+        )""",
+        """INSERT INTO users_new (id, tg_id, username, strikes, paused, last_active, banned_until)
+           SELECT id, tg_id, username, strikes, paused, last_active, banned_until FROM users""",
+        "DROP TABLE users",
+        "ALTER TABLE users_new RENAME TO users",
+        "CREATE INDEX IF NOT EXISTS idx_users_banned_until ON users (banned_until) WHERE banned_until IS NOT NULL",
+        "CREATE INDEX IF NOT EXISTS idx_users_tenant_strikes ON users (tenant_id, strikes, id)",
+        """CREATE TABLE daily_stats_new (
+            tenant_id INTEGER NOT NULL DEFAULT 0,
+            day TEXT,
+            metric TEXT,
+            value INTEGER DEFAULT 0,
+            PRIMARY KEY (tenant_id, day, metric)
+        )""",
+        "INSERT INTO daily_stats_new (day, metric, value) SELECT day, metric, value FROM daily_stats",
+        "DROP TABLE daily_stats",
+        "ALTER TABLE daily_stats_new RENAME TO daily_stats",
+        "ALTER TABLE notifications ADD COLUMN tenant_id INTEGER NOT NULL DEFAULT 0",
+    ],
+    # 11: fsm_states.updated_at from REAL epoch seconds to INTEGER epoch milliseconds
+    [
+        """CREATE TABLE fsm_states_new (
+            key TEXT PRIMARY KEY,
+            state TEXT,
+            data TEXT,
+            updated_at INTEGER
+        )""",
+        """INSERT INTO fsm_states_new (key, state, data, updated_at)
+           SELECT key, state, data, CAST(updated_at * 1000 AS INTEGER) FROM fsm_states""",
+        "DROP TABLE fsm_states",
+        "ALTER TABLE fsm_states_new RENAME TO fsm_states",
+        "CREATE INDEX IF NOT EXISTS idx_fsm_states_updated ON fsm_states (updated_at)",
+    ],
+    # 12: one index per admin panel filter (queries.PANEL_INDEX), so a page seeks
+    # its own rows instead of walking the tenant's whole strikes index
+    [
+        "DROP INDEX IF EXISTS idx_users_tenant_strikes",
+        "CREATE INDEX IF NOT EXISTS idx_users_panel_strikes ON users (tenant_id, strikes, id) WHERE strikes >= 2",
+        """CREATE INDEX IF NOT EXISTS idx_users_panel_banned ON users (tenant_id, strikes, id)
+           WHERE strikes >= 4 OR banned_until IS NOT NULL""",
+        "CREATE INDEX IF NOT EXISTS idx_users_panel_paused ON users (tenant_id, strikes, id) WHERE paused = 1",
+        "CREATE INDEX IF NOT EXISTS idx_users_tenant_active ON users (tenant_id, last_active)",
+    ],
+    # 13: a tenant's users in id order (rowid is the index's implicit last column), for exports
+    [
+        "CREATE INDEX IF NOT EXISTS idx_users_tenant ON users (tenant_id)",
+    ],
+    # 14: each video's proofs waiting for review, oldest first (queries "pending_reviews")
+    [
+        """CREATE INDEX IF NOT EXISTS idx_tasks_video_pending ON tasks (video_id, proof_uploaded_at)
+           WHERE proof_uploaded_at IS NOT NULL AND verified=0 AND expired=0""",
+    ],
+    # 15: per-row retry backoff for failed notifications (epoch ms; 0 = send now)
+    [
+        "ALTER TABLE notifications ADD COLUMN next_attempt_at INTEGER NOT NULL DEFAULT 0",
+    ],
+]
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Apply every migration newer than the DB's version; returns the final version."""
+    version = schema_version(conn)
+    for target, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+        if callable(statements):
+            statements(conn)
+            statements = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute(f"PRAGMA user_version={target}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        version = target
+    return version
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import logging
+import time
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+from cache import TTLCache
+from db import fetchone, fetchall, execute, write
+from queries import SQL
+from tenants import DEFAULT_TENANT
+from utils import TokenBucket, time_now, SECOND_MS
+
+GLOBAL_RATE = 25  # messages per second across all chats of one bot
+CHAT_RATE = 1     # messages per second to a single chat
+MAX_ATTEMPTS = 5
+ERROR_BACKOFF = 5  # seconds to wait after a failed pass (locked or broken database)
+RETRY_BACKOFF = 5  # seconds before a failed send is retried, doubled per attempt
+
+class Notifier:
+    """Background sender for outbound messages.
+
+    Messages are persisted in the notifications table before sending and only
+    deleted once Telegram accepts them, so a restart resumes where it left off.
+    Rows sharing a coalesce_key collapse into one pending message. Each row
+    goes out through its tenant's bot, under that bot's own rate limits. A
+    failed send waits RETRY_BACKOFF * 2**attempts before its next try, and a
+    bot paused by RetryAfter has its rows left out of the batch, so neither
+    holds up the rest of the queue.
+    """
+
+    def __init__(self, global_rate=GLOBAL_RATE, chat_rate=CHAT_RATE, max_attempts=MAX_ATTEMPTS, batch_size=100):
+        self.chat_rate = chat_rate
+        self.max_attempts = max_attempts
+        self.batch_size = batch_size
+        self.global_rate = global_rate
+        self.bots = {}
+        self._globals = {}
+        self._chats = TTLCache(maxsize=10000, ttl=60)
+        self._paused_until = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self, bots):
+        """`bots` maps tenant id -> Bot."""
+        self.bots = dict(bots)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def send(self, chat_id, text, coalesce_key=None, tenant_id=DEFAULT_TENANT):
+        await execute(SQL["insert_notification"], (tenant_id, chat_id, text, coalesce_key, time_now()))
+        self._wakeup.set()
+
+    def _chat_bucket(self, tenant_id, chat_id):
+        bucket = self._chats.get((tenant_id, chat_id))
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate)
+            self._chats.set((tenant_id, chat_id), bucket)
+        return bucket
+
+    def _bot_bucket(self, tenant_id):
+        bucket = self._globals.get(tenant_id)
+        if bucket is None:
+            bucket = self._globals[tenant_id] = TokenBucket(self.global_rate)
+        return bucket
+
+    def _paused(self):
+        now = time.monotonic()
+        return {t: until - now for t, until in self._paused_until.items() if until > now}
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                paused = self._paused()
+                rows = await fetchall(SQL["next_notifications"], (time_now(), json.dumps(list(paused)), self.batch_size))
+                if rows:
+                    delay = await self._drain(rows)
+                else:
+                    # Nothing sendable now: sleep until the next retry or pause ends, or a new send().
+                    due = (await fetchone(SQL["next_notification_due"], (json.dumps(list(paused)),)))["due"]
+                    waits = list(paused.values()) + ([max(0, due - time_now()) / SECOND_MS] if due is not None else [])
+                    delay = min(waits) if waits else None
+                    if delay == 0:
+                        continue
+            except Exception:
+                logging.exception("Notification pass failed")
+                await asyncio.sleep(ERROR_BACKOFF)
+                continue
+            if delay is None:
+                await self._wakeup.wait()
+            elif delay:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _drain(self, rows):
+        """Send what the rate limits allow; returns how long to wait before the next pass."""
+        done, failed = [], []
+        delay = 0.0
+        try:
+            for row in rows:
+                tenant_id = row["tenant_id"]
+                bot = self.bots.get(tenant_id)
+                if bot is None:
+                    logging.warning("Dropping notification %s: no bot for tenant %s", row["id"], tenant_id)
+                    done.append(row["id"])
+                    continue
+                # A throttled bot only holds back its own rows.
+                chat, global_ = self._chat_bucket(tenant_id, row["chat_id"]), self._bot_bucket(tenant_id)
+                if self._paused_until.get(tenant_id, 0.0) > time.monotonic():
+                    continue  # paused mid-batch; the next query leaves this tenant out until the pause ends
+                wait = chat.delay()
+                if wait <= 0 and not global_.consume():
+                    wait = global_.delay()
+                if wait > 0:
+                    delay = wait if not delay else min(delay, wait)
+                    continue
+                chat.consume()
+                try:
+                    await bot.send_message(row["chat_id"], row["text"])
+                except TelegramRetryAfter as e:
+                    self._paused_until[tenant_id] = time.monotonic() + e.retry_after
+                except (TelegramForbiddenError, TelegramBadRequest) as e:
+                    logging.warning("Dropping notification %s to %s: %s", row["id"], row["chat_id"], e)
+                    done.append(row["id"])
+                except Exception:
+                    logging.exception("Notification %s to %s failed", row["id"], row["chat_id"])
+                    failed.append(row)
+                else:
+                    done.append(row["id"])
+            return delay
+        finally:
+            if done or failed:
+                await write(self._settle, done, failed)
+
+    def _settle(self, conn, done, failed):
+        conn.executemany(SQL["delete_notification"], [(i,) for i in done])
+        now = time_now()
+        conn.executemany(SQL["fail_notification"],
+                         [(now + RETRY_BACKOFF * SECOND_MS * 2 ** r["attempts"], r["id"]) for r in failed])
+        conn.execute(SQL["drop_failed_notifications"], (self.max_attempts,))
+
+notifier = Notifier()
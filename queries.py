@@ -0,0 +1,244 @@
+"""Every SQL statement the bot runs, by name.
+
+    python queries.py        # EXPLAIN QUERY PLAN check against a fresh, migrated DB
+
+Call sites look statements up in SQL instead of writing them inline, so each
+one has a single canonical text (and a single entry in every connection's
+statement cache and in the bot_db_query_seconds metric). Statements marked
+hot run while handling an update; check_plans fails if one of them plans a
+full table scan or a temp B-tree, unless that exact plan step is listed in
+its `allow` with a reason next to it. A statement registered with an
+`index` must read its table only through that index, and a `stream`
+statement must return rows in index order without a temp B-tree. Schema
+DDL lives in db.py and migrations.py.
+"""
+import sys
+import tempfile
+import os
+
+SQL = {}
+HOT = set()
+ALLOW = {}
+INDEX = {}
+STREAM = set()
+
+def register(name, sql, hot=False, allow=(), index=None, stream=False):
+    if name in SQL:
+        raise ValueError(f"Duplicate statement name: {name}")
+    SQL[name] = " ".join(sql.split())
+    if hot:
+        HOT.add(name)
+    ALLOW[name] = tuple(allow)
+    if index:
+        INDEX[name] = index
+    if stream:
+        STREAM.add(name)
+    return SQL[name]
+
+OPEN_TASK = "proof_uploaded_at IS NULL AND verified=0 AND expired=0"
+SUBMITTED_TASK = "proof_uploaded_at IS NOT NULL AND verified=0 AND expired=0"
+
+# users
+# users are scoped to a tenant (tenants.py): tg_id lookups always pass tenant_id first
+register("user_by_tg", "SELECT id, tenant_id, paused, strikes, banned_until, last_active FROM users WHERE tenant_id=? AND tg_id=?", hot=True)
+register("user_id_by_tg", "SELECT id FROM users WHERE tenant_id=? AND tg_id=?")
+register("insert_user", "INSERT OR IGNORE INTO users (tenant_id, tg_id, username, last_active) VALUES (?, ?, ?, ?)", hot=True)
+register("touch_user", "UPDATE users SET last_active=? WHERE id=?", hot=True)
+register("pause_user", "UPDATE users SET paused=1 WHERE id=?", hot=True)
+register("resume_user", "UPDATE users SET paused=0 WHERE tenant_id=? AND tg_id=?", hot=True)
+register("viewer_strikes", "SELECT tenant_id, tg_id, strikes FROM users WHERE id=?", hot=True)
+register("strike_user", "UPDATE users SET strikes = strikes + 1 WHERE id=? RETURNING tenant_id, tg_id, strikes", hot=True)
+register("strike_user_by_tg",
+         "UPDATE users SET strikes = strikes + 1 WHERE tenant_id=? AND tg_id=? RETURNING id, strikes", hot=True)
+register("unstrike_user_by_tg", "UPDATE users SET strikes = MAX(strikes-1, 0) WHERE tenant_id=? AND tg_id=?")
+register("user_stats", "SELECT proofs, accepted, rejected FROM user_stats WHERE user_id=?", hot=True)
+register("user_credits", "SELECT given, received FROM user_credits WHERE user_id=?", hot=True)
+
+# videos
+register("count_active_videos", "SELECT COUNT(*) as cnt FROM videos WHERE user_id=? AND active=1", hot=True)
+register("active_videos", "SELECT * FROM videos WHERE user_id=? AND active=1", hot=True)
+register("video_by_id", "SELECT * FROM videos WHERE id=?", hot=True)
+register("video_owner_tg", "SELECT u.tg_id FROM videos v JOIN users u ON v.user_id=u.id WHERE v.id=?", hot=True)
+register("insert_video", """
+    INSERT INTO videos (user_id, title, thumbnail_file_id, duration, yt_link, uploaded_at, active)
+    VALUES (?, ?, ?, ?, ?, ?, 1)""", hot=True)
+register("deactivate_video", "UPDATE videos SET active=0 WHERE id=? AND user_id=?", hot=True)
+
+# tasks: transitions (see tasks.py for the state machine)
+register("insert_task", "INSERT INTO tasks (video_id, assigned_to, assigned_at) VALUES (?, ?, ?)", hot=True)
+register("open_task", f"SELECT id, video_id FROM tasks WHERE id=? AND assigned_to=? AND {OPEN_TASK}", hot=True)
+register("open_task_of_user", f"""
+    SELECT t.id, v.title FROM tasks t JOIN videos v ON t.video_id = v.id
+    WHERE t.assigned_to=? AND {OPEN_TASK}""", hot=True)
+register("skip_task", f"UPDATE tasks SET expired=1 WHERE id=? AND assigned_to=? AND {OPEN_TASK} RETURNING id", hot=True)
+register("submit_proof", f"""
+    UPDATE tasks SET proof_file_id=?, proof_uploaded_at=?
+    WHERE id=? AND assigned_to=? AND {OPEN_TASK}
+    RETURNING video_id, assigned_to""", hot=True)
+register("verify_task", f"""
+    UPDATE tasks
+    SET verified=1, verification_result=?, verification_at=?, reviewer_id=?, reviewer_msg=?, expired=?
+    WHERE id=? AND {SUBMITTED_TASK} AND video_id IN (SELECT id FROM videos WHERE user_id=?)
+    RETURNING video_id, assigned_to, proof_uploaded_at""", hot=True)
+# tasks.get_tasks_for_review merges these per-video lists, so no statement sorts
+register("uploader_video_ids", "SELECT id FROM videos WHERE user_id=?", hot=True)
+register("pending_reviews", f"""
+    SELECT t.*, v.title FROM tasks t
+    JOIN videos v ON t.video_id = v.id
+    WHERE t.video_id=? AND {SUBMITTED_TASK}
+    ORDER BY t.proof_uploaded_at ASC
+    LIMIT ?""", hot=True)
+register("expire_stale_proofs", f"UPDATE tasks SET expired=1 WHERE {SUBMITTED_TASK} AND proof_uploaded_at <= ?")
+
+# expiry scheduler
+register("open_task_deadlines", f"SELECT id, assigned_at FROM tasks WHERE {OPEN_TASK}")
+register("review_deadlines", f"SELECT id, proof_uploaded_at FROM tasks WHERE {SUBMITTED_TASK}")
+register("ban_deadlines", "SELECT id, banned_until FROM users WHERE banned_until IS NOT NULL")
+register("expire_assignment", f"UPDATE tasks SET expired=1 WHERE id=? AND {OPEN_TASK}", hot=True)
+register("expire_review", f"UPDATE tasks SET expired=1 WHERE id=? AND {SUBMITTED_TASK}", hot=True)
+register("ban_state", "SELECT tenant_id, tg_id, banned_until FROM users WHERE id=?", hot=True)
+register("lift_ban", "UPDATE users SET banned_until=NULL WHERE id=?", hot=True)
+
+# matching.VideoIndex.load: whole-table reads at startup
+register("index_videos", "SELECT v.id, v.user_id, u.tenant_id FROM videos v JOIN users u ON v.user_id = u.id WHERE v.active=1")
+register("index_views", "SELECT video_id, COUNT(*) as cnt FROM tasks WHERE proof_uploaded_at IS NOT NULL GROUP BY video_id")
+register("index_credits", "SELECT user_id, given - received AS balance FROM user_credits")
+register("index_assignments", "SELECT assigned_to, video_id FROM tasks")
+
+# notifications outbox; the queue is drained continuously so it stays a few rows long
+register("insert_notification",
+         "INSERT OR IGNORE INTO notifications (tenant_id, chat_id, text, coalesce_key, created_at) VALUES (?, ?, ?, ?, ?)",
+         hot=True)
+# Both take the JSON list of tenants paused by a RetryAfter, whose rows are left for later.
+register("next_notifications", """
+    SELECT * FROM notifications
+    WHERE next_attempt_at <= ? AND tenant_id NOT IN (SELECT value FROM json_each(?))
+    ORDER BY id LIMIT ?""", hot=True,
+    allow=("SCAN notifications",))  # rowid order, stops after LIMIT rows
+register("next_notification_due",
+         "SELECT MIN(next_attempt_at) AS due FROM notifications WHERE tenant_id NOT IN (SELECT value FROM json_each(?))",
+         hot=True, allow=("SCAN notifications",))  # short queue table, see above
+register("delete_notification", "DELETE FROM notifications WHERE id=?", hot=True)
+register("fail_notification", "UPDATE notifications SET attempts=attempts+1, next_attempt_at=? WHERE id=?", hot=True)
+register("drop_failed_notifications", "DELETE FROM notifications WHERE attempts >= ?", hot=True,
+         allow=("SCAN notifications",))  # short queue table, see above
+
+# FSM storage
+register("fsm_get", "SELECT state, data FROM fsm_states WHERE key=? AND updated_at > ?", hot=True)
+register("fsm_delete", "DELETE FROM fsm_states WHERE key=?", hot=True)
+register("fsm_put", "INSERT OR REPLACE INTO fsm_states (key, state, data, updated_at) VALUES (?, ?, ?, ?)", hot=True)
+register("fsm_sweep", "DELETE FROM fsm_states WHERE updated_at <= ?")
+
+# logs
+register("insert_log", "INSERT INTO logs (event, user_id, details, created_at) VALUES (?, ?, ?, ?)", hot=True)
+register("oldest_logs", "SELECT * FROM logs ORDER BY id LIMIT ?")
+register("delete_log", "DELETE FROM logs WHERE id=?")
+
+# rollups: one UPSERT per table, callers pass 0 for the counters they don't bump
+ROLLUP_COLUMNS = {
+    "video_stats": ("video_id", ("assigned", "proofs", "accepted", "rejected")),
+    "user_stats": ("user_id", ("assigned", "proofs", "accepted", "rejected", "strikes", "reviews", "review_seconds")),
+    "user_credits": ("user_id", ("given", "received", "rejected")),
+}
+for _table, (_key, _cols) in ROLLUP_COLUMNS.items():
+    register(f"bump_{_table}", f"""
+        INSERT INTO {_table} ({_key}, {", ".join(_cols)}) VALUES (?, {", ".join("?" * len(_cols))})
+        ON CONFLICT ({_key}) DO UPDATE SET {", ".join(f"{c} = {c} + excluded.{c}" for c in _cols)}""", hot=True)
+register("bump_daily_stats", """
+    INSERT INTO daily_stats (tenant_id, day, metric, value) SELECT tenant_id, ?, ?, ? FROM users WHERE id=?
+    ON CONFLICT (tenant_id, day, metric) DO UPDATE SET value = value + excluded.value""", hot=True)
+register("daily_report", "SELECT day, metric, value FROM daily_stats WHERE tenant_id=? AND day >= ? ORDER BY day DESC")
+
+# admin panel: one tenant's users ordered by (strikes, id) descending, one family per filter.
+# Paging uses two index seeks (rest of the cursor's strikes band, then lower/higher
+# bands) instead of one row-value range, which SQLite only bounds on strikes.
+# Each filter reads through its own index (migration 12), pinned with INDEXED BY
+# and checked by check_plans: the partial (tenant_id, strikes, id) indexes hold
+# only matching rows, so a page costs O(page size); "active" seeks its
+# last_active range and sorts only the users active in it.
+PANEL_WHERE = {
+    "strikes": "tenant_id = ? AND strikes >= 2",
+    # the first OR repeats idx_users_panel_banned's WHERE so the partial index applies
+    "banned": "tenant_id = ? AND (strikes >= 4 OR banned_until IS NOT NULL) AND (strikes >= 4 OR banned_until > ?)",
+    "paused": "tenant_id = ? AND paused = 1",
+    "active": "tenant_id = ? AND last_active >= ?",
+}
+PANEL_INDEX = {
+    "strikes": "idx_users_panel_strikes",
+    "banned": "idx_users_panel_banned",
+    "paused": "idx_users_panel_paused",
+    "active": "idx_users_tenant_active",
+}
+for _name, _where in PANEL_WHERE.items():
+    _users = f"users INDEXED BY {PANEL_INDEX[_name]}"
+    register(f"panel_first_{_name}", f"SELECT * FROM {_users} WHERE {_where} ORDER BY strikes DESC, id DESC LIMIT ?",
+             index=PANEL_INDEX[_name])
+    for _direction, _op, _order in (("next", "<", "DESC"), ("prev", ">", "ASC")):
+        register(f"panel_{_direction}_{_name}", f"""
+            SELECT * FROM (SELECT * FROM {_users} WHERE {_where} AND strikes = ? AND id {_op} ?
+                           ORDER BY strikes {_order}, id {_order} LIMIT ?)
+            UNION ALL
+            SELECT * FROM (SELECT * FROM {_users} WHERE {_where} AND strikes {_op} ?
+                           ORDER BY strikes {_order}, id {_order} LIMIT ?)
+            ORDER BY strikes {_order}, id {_order} LIMIT ?""", index=PANEL_INDEX[_name])
+
+# admin bulk actions, run once per (tenant_id, id)
+register("bulk_strike", "UPDATE users SET strikes = strikes + 1 WHERE tenant_id=? AND tg_id=?")
+register("bulk_unstrike", "UPDATE users SET strikes = MAX(strikes-1, 0) WHERE tenant_id=? AND tg_id=?")
+register("bulk_ban", "UPDATE users SET banned_until=? WHERE tenant_id=? AND tg_id=?")
+register("bulk_unban", "UPDATE users SET banned_until=NULL, strikes = MIN(strikes, 3) WHERE tenant_id=? AND tg_id=?")
+register("bulk_pause", "UPDATE users SET paused=1 WHERE tenant_id=? AND tg_id=?")
+register("bulk_resume", "UPDATE users SET paused=0 WHERE tenant_id=? AND tg_id=?")
+register("bulk_deactivate", "UPDATE videos SET active=0 WHERE user_id IN (SELECT id FROM users WHERE tenant_id=?) AND id=?")
+
+# admin exports: whole-tenant dumps, streamed row by row (bulk.export_table), so
+# the order must come from an index and never from a sort of the whole result.
+# videos and tasks are walked in rowid order (CROSS JOIN keeps them the outer
+# loop) with the owner's tenant checked by primary key.
+register("export_users", "SELECT * FROM users WHERE tenant_id=? ORDER BY id", stream=True)
+register("export_videos", "SELECT v.* FROM videos v CROSS JOIN users u ON v.user_id = u.id WHERE u.tenant_id=? ORDER BY v.id",
+         stream=True)
+register("export_tasks", "SELECT t.* FROM tasks t CROSS JOIN users u ON t.assigned_to = u.id WHERE u.tenant_id=? ORDER BY t.id",
+         stream=True)
+
+def plan(conn, name):
+    """EXPLAIN QUERY PLAN detail lines for one statement, with every parameter bound to NULL."""
+    sql = SQL[name]
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", (None,) * sql.count("?"))]
+
+def check_plans(conn):
+    """[(name, plan step)] for hot statements that scan a whole table or sort in a temp B-tree,
+    for statements registered with an `index` that read their table any other way, and for
+    `stream` statements that sort in a temp B-tree."""
+    failures = []
+    for name in sorted(STREAM):
+        failures += [(name, step) for step in plan(conn, name) if "TEMP B-TREE" in step]
+    for name, index in sorted(INDEX.items()):
+        for step in plan(conn, name):
+            if step.startswith(("SEARCH ", "SCAN ")) and not step.startswith("SCAN (") and f" INDEX {index} " not in step:
+                failures.append((name, step))
+    for name in sorted(HOT):
+        for step in plan(conn, name):
+            full_scan = (step.startswith("SCAN ") and " USING " not in step and " VIRTUAL TABLE " not in step
+                         and not step.startswith(("SCAN (", "SCAN CONSTANT ROW")))
+            if (full_scan or "TEMP B-TREE" in step) and step not in ALLOW[name]:
+                failures.append((name, step))
+    return failures
+
+def main():
+    import db
+    with tempfile.TemporaryDirectory() as tmp:
+        db.init_db(os.path.join(tmp, "plans.db"))
+        conn = db.get_db(os.path.join(tmp, "plans.db"))
+        try:
+            for name in sorted(SQL):
+                print(f"{'*' if name in HOT else ' '} {name}: {' | '.join(plan(conn, name)) or '-'}")
+            failures = check_plans(conn)
+        finally:
+            conn.close()
+    for name, step in failures:
+        print(f"FAIL {name}: {step}", file=sys.stderr)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""Move old rows out of the logs table into compressed daily NDJSON archives.
+
+    python retention.py archive [--days 30]
+    python retention.py grep [--event E] [--user ID] [--since DAY] [--until DAY]
+
+Rows are appended to log_archive/logs-YYYY-MM-DD.ndjson.gz (one gzip member
+per batch) and then deleted in the same small batch, walking the logs table
+by primary key so no extra index is needed. A crash between the append and
+the delete can repeat a batch in the archive; readers can dedupe on "id".
+Rows without a created_at go to logs-undated.ndjson.gz.
+"""
+import argparse
+import asyncio
+import glob
+import gzip
+import json
+import logging
+import os
+from itertools import takewhile
+import db
+from queries import SQL
+from utils import ms_to_day, days_ago
+
+ARCHIVE_DIR = "log_archive"
+LOG_RETENTION_DAYS = 30
+BATCH_SIZE = 500
+
+def _append(archive_dir, rows):
+    by_day = {}
+    for row in rows:
+        day = ms_to_day(row["created_at"]) if row["created_at"] is not None else "undated"
+        by_day.setdefault(day, []).append(row)
+    os.makedirs(archive_dir, exist_ok=True)
+    for day, day_rows in by_day.items():
+        path = os.path.join(archive_dir, f"logs-{day}.ndjson.gz")
+        with gzip.open(path, "at", encoding="utf-8") as out:
+            for row in day_rows:
+                out.write(json.dumps(dict(row)) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+
+async def archive_logs(days=LOG_RETENTION_DAYS, archive_dir=ARCHIVE_DIR, batch_size=BATCH_SIZE):
+    """Archive and delete log rows older than `days`; returns how many were moved."""
+    cutoff = days_ago(days)
+    moved = 0
+    while True:
+        rows = await db.fetchall(SQL["oldest_logs"], (batch_size,))
+        rows = list(takewhile(lambda r: (r["created_at"] or 0) < cutoff, rows))
+        if not rows:
+            return moved
+        await asyncio.to_thread(_append, archive_dir, rows)
+        await db.write(lambda conn: conn.executemany(SQL["delete_log"], [(r["id"],) for r in rows]))
+        moved += len(rows)
+        if len(rows) < batch_size:
+            return moved
+
+async def run_retention(interval=60 * 60, days=LOG_RETENTION_DAYS, archive_dir=ARCHIVE_DIR):
+    """Background loop for main: archive once per `interval` seconds."""
+    while True:
+        try:
+            await archive_logs(days, archive_dir)
+        except Exception:
+            logging.exception("Log archiving failed")
+        await asyncio.sleep(interval)
+
+def iter_archive(archive_dir=ARCHIVE_DIR, event=None, user_id=None, since=None, until=None):
+    """Stream archived rows matching the filters; since/until are YYYY-MM-DD (inclusive)."""
+    for path in sorted(glob.glob(os.path.join(archive_dir, "logs-*.ndjson.gz"))):
+        day = os.path.basename(path)[len("logs-"):-len(".ndjson.gz")]
+        if (since and day < since) or (until and day > until):
+            continue
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                row = json.loads(line)
+                if event is not None and row["event"] != event:
+                    continue
+                if user_id is not None and row["user_id"] != user_id:
+                    continue
+                yield row
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Archive or search the bot's event log.")
+    p.add_argument("--dir", default=ARCHIVE_DIR)
+    sub = p.add_subparsers(dest="cmd", required=True)
+    a = sub.add_parser("archive")
+    a.add_argument("--days", type=int, default=LOG_RETENTION_DAYS)
+    g = sub.add_parser("grep")
+    g.add_argument("--event")
+    g.add_argument("--user", type=int)
+    g.add_argument("--since")
+    g.add_argument("--until")
+    args = p.parse_args(argv)
+    if args.cmd == "archive":
+        async def run():
+            db.open_pool()
+            try:
+                return await archive_logs(args.days, args.dir)
+            finally:
+                db.close_pool()
+        print(f"Archived {asyncio.run(run())} log rows.")
+    else:
+        for row in iter_archive(args.dir, args.event, args.user, args.since, args.until):
+            print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
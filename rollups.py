@@ -0,0 +1,63 @@
+"""Incrementally maintained aggregates over tasks.
+
+Each hook runs inside the transaction that performs the underlying change,
+so the rollup rows never drift from the tasks table. Reports read these
+small tables instead of scanning tasks/logs.
+
+    daily_stats  (tenant_id, day, metric) -> value
+    video_stats  video_id -> assigned, proofs, accepted, rejected
+    user_stats   user_id  -> assigned, proofs, accepted, rejected, strikes  (as viewer)
+                             reviews, review_seconds                          (as uploader)
+    user_credits user_id  -> given (accepted views of others' videos), received
+                             (accepted views of own videos), rejected
+"""
+from queries import SQL, ROLLUP_COLUMNS
+from utils import time_now, ms_to_day, days_ago
+
+DAILY_METRICS = ("assigned", "proofs", "accepted", "rejected", "strikes", "reviews", "review_seconds")
+
+def today():
+    return ms_to_day(time_now())
+
+def _bump(conn, table, key, **deltas):
+    _, cols = ROLLUP_COLUMNS[table]
+    conn.execute(SQL[f"bump_{table}"], (key, *(deltas.get(c, 0) for c in cols)))
+
+def _bump_daily(conn, user_id, **deltas):
+    """Add to today's metrics of user_id's tenant."""
+    day = today()
+    conn.executemany(SQL["bump_daily_stats"], [(day, metric, value, user_id) for metric, value in deltas.items()])
+
+def on_assign(conn, video_id, viewer_id):
+    _bump_daily(conn, viewer_id, assigned=1)
+    _bump(conn, "video_stats", video_id, assigned=1)
+    _bump(conn, "user_stats", viewer_id, assigned=1)
+
+def on_proof(conn, video_id, viewer_id):
+    _bump_daily(conn, viewer_id, proofs=1)
+    _bump(conn, "video_stats", video_id, proofs=1)
+    _bump(conn, "user_stats", viewer_id, proofs=1)
+
+def on_verify(conn, video_id, viewer_id, uploader_id, accepted, review_seconds):
+    result = "accepted" if accepted else "rejected"
+    _bump_daily(conn, uploader_id, **{result: 1}, reviews=1, review_seconds=review_seconds)
+    _bump(conn, "video_stats", video_id, **{result: 1})
+    _bump(conn, "user_stats", viewer_id, **{result: 1})
+    _bump(conn, "user_stats", uploader_id, reviews=1, review_seconds=review_seconds)
+    if accepted:
+        _bump(conn, "user_credits", viewer_id, given=1)
+        _bump(conn, "user_credits", uploader_id, received=1)
+    else:
+        _bump(conn, "user_credits", viewer_id, rejected=1)
+
+def on_strike(conn, user_id):
+    _bump_daily(conn, user_id, strikes=1)
+    _bump(conn, "user_stats", user_id, strikes=1)
+
+def daily_report(conn, days, tenant_id):
+    """{day: {metric: value}} of one tenant for the last `days` days, newest first."""
+    since = ms_to_day(days_ago(days - 1))
+    report = {}
+    for row in conn.execute(SQL["daily_report"], (tenant_id, since)):
+        report.setdefault(row["day"], dict.fromkeys(DAILY_METRICS, 0))[row["metric"]] = row["value"]
+    return report
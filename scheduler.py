@@ -0,0 +1,94 @@
+import asyncio
+import heapq
+import logging
+from cache import user_cache
+from db import read, write
+from queries import SQL
+from utils import time_now, SECOND_MS
+
+ASSIGNMENT_TIMEOUT = 60 * 60 * SECOND_MS  # accepted task must get a proof within an hour
+REVIEW_TIMEOUT = 20 * 60 * SECOND_MS      # uploader has 20 minutes to verify a proof
+
+class ExpiryScheduler:
+    """Min-heap of (due epoch ms, kind, id) deadlines, each fired at its due time.
+
+    Firing is a guarded UPDATE, so entries made stale by a later transition
+    (proof uploaded, task verified, ban lifted early) are harmless no-ops.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def schedule(self, kind, item_id, due):
+        heapq.heappush(self._heap, (due, kind, item_id))
+        if self._heap[0][0] == due:
+            self._wakeup.set()
+
+    def load(self, conn):
+        """Rebuild the heap from open tasks and active bans."""
+        heap = []
+        for row in conn.execute(SQL["open_task_deadlines"]):
+            heap.append((row["assigned_at"] + ASSIGNMENT_TIMEOUT, "assignment", row["id"]))
+        for row in conn.execute(SQL["review_deadlines"]):
+            heap.append((row["proof_uploaded_at"] + REVIEW_TIMEOUT, "review", row["id"]))
+        for row in conn.execute(SQL["ban_deadlines"]):
+            heap.append((row["banned_until"], "ban", row["id"]))
+        heapq.heapify(heap)
+        return heap
+
+    async def start(self):
+        self._heap = list(heapq.merge(self._heap, await read(self.load)))
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time_now()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap))
+            if due:
+                try:
+                    expired_users = await write(self._fire, due, now)
+                except Exception:
+                    logging.exception("Expiry of %d deadlines failed", len(due))
+                    for entry in due:
+                        heapq.heappush(self._heap, entry)
+                    await asyncio.sleep(1)
+                    continue
+                for key in expired_users:
+                    user_cache.invalidate(key)
+                continue
+            timeout = (self._heap[0][0] - now) / SECOND_MS if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _fire(self, conn, due, now):
+        """Apply due expiries in one transaction; returns user_cache keys of users whose ban was lifted."""
+        unbanned = []
+        for _, kind, item_id in due:
+            if kind == "assignment":
+                conn.execute(SQL["expire_assignment"], (item_id,))
+            elif kind == "review":
+                conn.execute(SQL["expire_review"], (item_id,))
+            elif kind == "ban":
+                row = conn.execute(SQL["ban_state"], (item_id,)).fetchone()
+                if row and row["banned_until"] is not None and row["banned_until"] <= now:
+                    conn.execute(SQL["lift_ban"], (item_id,))
+                    unbanned.append((row["tenant_id"], row["tg_id"]))
+        return unbanned
+
+expiry_scheduler = ExpiryScheduler()
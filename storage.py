@@ -0,0 +1,106 @@
+import asyncio
+import json
+import logging
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder
+from cache import TTLCache
+from db import fetchone, write
+from queries import SQL
+from utils import time_now, SECOND_MS
+
+FSM_TTL = 7 * 24 * 60 * 60  # abandoned flows are dropped after a week
+
+class SQLiteStorage(BaseStorage):
+    """FSM storage persisted in the fsm_states table.
+
+    Hot sessions are served from an LRU cache that is updated on every write;
+    the writes themselves are batched and flushed every `flush_interval`
+    seconds. States untouched for `ttl` seconds are treated as empty and
+    swept from the table periodically.
+    """
+
+    def __init__(self, ttl=FSM_TTL, cache_size=10000, flush_interval=0.5, sweep_interval=60 * 60, key_builder=None):
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.sweep_interval = sweep_interval
+        self.key_builder = key_builder or DefaultKeyBuilder(with_bot_id=True, with_destiny=True)
+        self._cache = TTLCache(maxsize=cache_size, ttl=ttl)
+        self._dirty = {}
+        self._task = None
+
+    def _cutoff(self):
+        return time_now() - self.ttl * SECOND_MS
+
+    async def _load(self, key):
+        k = self.key_builder.build(key)
+        record = self._dirty.get(k) or self._cache.get(k)
+        if record is None:
+            row = await fetchone(SQL["fsm_get"], (k, self._cutoff()))
+            record = (row["state"], json.loads(row["data"])) if row else (None, {})
+            self._cache.set(k, record)
+        return k, record
+
+    def _store(self, k, state, data):
+        record = (state, data)
+        self._cache.set(k, record)
+        self._dirty[k] = record
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def set_state(self, key, state=None):
+        k, (_, data) = await self._load(key)
+        self._store(k, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key):
+        return (await self._load(key))[1][0]
+
+    async def set_data(self, key, data):
+        k, (state, _) = await self._load(key)
+        self._store(k, state, dict(data))
+
+    async def get_data(self, key):
+        return dict((await self._load(key))[1][1])
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, {}
+        now = time_now()
+        def persist(conn):
+            conn.executemany(SQL["fsm_delete"],
+                             [(k,) for k, (state, data) in dirty.items() if state is None and not data])
+            conn.executemany(SQL["fsm_put"],
+                             [(k, state, json.dumps(data), now) for k, (state, data) in dirty.items()
+                              if state is not None or data])
+        try:
+            await write(persist)
+        except BaseException:
+            for k, record in dirty.items():
+                self._dirty.setdefault(k, record)
+            raise
+
+    async def sweep(self):
+        await write(lambda conn: conn.execute(SQL["fsm_sweep"], (self._cutoff(),)))
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_sweep = loop.time()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if loop.time() >= next_sweep:
+                    await self.sweep()
+                    next_sweep = loop.time() + self.sweep_interval
+            except Exception:
+                logging.exception("FSM storage flush failed")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -1,94 +1,153 @@
-from db import get_db, _db_lock
-from datetime import datetime, timedelta
-
-def get_next_video_for_user(user_id):
-    """Find a video the user has not yet viewed and is not their own, ensuring fair rotation."""
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        # Get all active videos not owned by the user
-        c.execute("""
-            SELECT v.id FROM videos v
-            WHERE v.active=1 AND v.user_id != ? AND v.id NOT IN (
-                SELECT video_id FROM tasks WHERE assigned_to = ?
-            )
-        """, (user_id, user_id))
-        videos = [row["id"] for row in c.fetchall()]
-        if not videos:
-            conn.close()
+import heapq
+from itertools import islice
+from db import read, write, fetchone, fetchall, execute
+import rollups
+from queries import SQL
+from cache import user_cache
+from matching import video_index
+from scheduler import expiry_scheduler, ASSIGNMENT_TIMEOUT, REVIEW_TIMEOUT
+from tenants import DEFAULT_TENANT
+from utils import time_now, SECOND_MS
+
+async def load_video_index():
+    await read(video_index.load)
+
+async def get_next_video_for_user(user_id, tenant_id=DEFAULT_TENANT):
+    """Find a video of the user's tenant that they have not yet viewed and is not their own.
+
+    Least-viewed first, nudged towards owners who have given more views than
+    they received (see matching.CREDIT_CAP).
+    """
+    if not video_index.loaded:
+        await load_video_index()
+    return video_index.next_for(user_id, tenant_id)
+
+async def assign_task(video_id, user_id):
+    def insert(conn):
+        cur = conn.execute(SQL["insert_task"], (video_id, user_id, time_now()))
+        rollups.on_assign(conn, video_id, user_id)
+        return cur.lastrowid
+    task_id = await write(insert)
+    video_index.record_assignment(video_id, user_id)
+    expiry_scheduler.schedule("assignment", task_id, time_now() + ASSIGNMENT_TIMEOUT)
+    return task_id
+
+async def add_video(user_id, title, thumbnail_file_id, duration, yt_link, uploaded_at, tenant_id=DEFAULT_TENANT):
+    cur = await execute(SQL["insert_video"], (user_id, title, thumbnail_file_id, duration, yt_link, uploaded_at))
+    video_index.add_video(cur.lastrowid, user_id, tenant_id)
+    return cur.lastrowid
+
+async def deactivate_video(video_id, user_id):
+    """Deactivate a video owned by user_id; False if it is someone else's (or gone)."""
+    cur = await execute(SQL["deactivate_video"], (video_id, user_id))
+    if not cur.rowcount:
+        return False
+    video_index.remove_video(video_id)
+    return True
+
+# Task states, as guards on the tasks row (queries.OPEN_TASK / SUBMITTED_TASK).
+# Every transition below is a single conditional UPDATE ... RETURNING in one
+# write transaction, so a repeated or concurrent transition matches no row and
+# becomes a no-op (returns None).
+#   open      -> submitted (submit_proof) | expired (skip_task, assignment timeout)
+#   submitted -> verified (verify_task, accepted) | verified+expired (rejected, review timeout)
+
+async def open_task(task_id, user_id):
+    """The task if it is still open and assigned to user_id, else None."""
+    return await fetchone(SQL["open_task"], (task_id, user_id))
+
+async def skip_task(task_id, user_id):
+    """open -> expired; returns True if the task was skipped by this call."""
+    row = await write(lambda conn: conn.execute(SQL["skip_task"], (task_id, user_id)).fetchone())
+    return row is not None
+
+async def submit_proof(task_id, user_id, file_id, uploaded_at):
+    """open -> submitted; returns the uploader's Telegram id, or None if the task was not open."""
+    def attach(conn):
+        row = conn.execute(SQL["submit_proof"], (file_id, uploaded_at, task_id, user_id)).fetchone()
+        if row is None:
             return None
+        rollups.on_proof(conn, row["video_id"], row["assigned_to"])
+        owner = conn.execute(SQL["video_owner_tg"], (row["video_id"],)).fetchone()
+        return row["video_id"], owner["tg_id"]
+    res = await write(attach)
+    if res is None:
+        return None
+    video_id, uploader_tg = res
+    video_index.record_view(video_id)
+    expiry_scheduler.schedule("review", task_id, time_now() + REVIEW_TIMEOUT)
+    return uploader_tg
 
-        # For fairness: get view counts for these videos
-        candidate_views = []
-        for vid in videos:
-            c.execute("SELECT COUNT(*) as cnt FROM tasks WHERE video_id=? AND proof_uploaded_at IS NOT NULL", (vid,))
-            candidate_views.append((vid, c.fetchone()["cnt"]))
-        # Pick the one with lowest views
-        candidate_views.sort(key=lambda x: x[1])
-        selected_video_id = candidate_views[0][0]
-        conn.close()
-        return selected_video_id
-
-def assign_task(video_id, user_id):
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO tasks (video_id, assigned_to, assigned_at)
-            VALUES (?, ?, ?)
-        """, (video_id, user_id, datetime.utcnow().isoformat()))
-        conn.commit()
-        c.execute("SELECT last_insert_rowid() as tid")
-        task_id = c.fetchone()["tid"]
-        conn.close()
-        return task_id
-
-def get_task_for_review(uploader_id):
+REVIEW_BATCH = 10
+
+async def get_tasks_for_review(uploader_id, limit=REVIEW_BATCH):
+    """Up to `limit` submitted proofs on this uploader's videos, oldest first.
+
+    Each video's list comes in index order (idx_tasks_video_pending), at most
+    `limit` long; merging them here reads O(videos * limit) rows and sorts none.
+    """
+    def fetch(conn):
+        per_video = [conn.execute(SQL["pending_reviews"], (v["id"], limit)).fetchall()
+                     for v in conn.execute(SQL["uploader_video_ids"], (uploader_id,)).fetchall()]
+        return list(islice(heapq.merge(*per_video, key=lambda r: r["proof_uploaded_at"]), limit))
+    return await read(fetch)
+
+async def get_task_for_review(uploader_id):
     """Get the next submitted proof for this uploader to review."""
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("""
-            SELECT t.*, v.title FROM tasks t
-            JOIN videos v ON t.video_id = v.id
-            WHERE v.user_id=? AND t.proof_uploaded_at IS NOT NULL AND t.verified=0 AND t.expired=0
-            ORDER BY t.proof_uploaded_at ASC
-            LIMIT 1
-        """, (uploader_id,))
-        row = c.fetchone()
-        conn.close()
-        return row
-
-def mark_task_verified(task_id, result, reviewer_id, reviewer_msg=None):
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("""
-            UPDATE tasks 
-            SET verified=1, verification_result=?, verification_at=?, reviewer_id=?, reviewer_msg=?
-            WHERE id=?
-        """, (result, datetime.utcnow().isoformat(), reviewer_id, reviewer_msg, task_id))
-        conn.commit()
-        conn.close()
-
-def increment_strike(tg_id):
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        c.execute("SELECT strikes FROM users WHERE tg_id=?", (tg_id,))
-        user = c.fetchone()
-        if user is None: return
-        new_strikes = user["strikes"] + 1
-        c.execute("UPDATE users SET strikes=? WHERE tg_id=?", (new_strikes, tg_id))
-        conn.commit()
-        conn.close()
-        return new_strikes
-
-def reset_task_after_rejection(task_id):
-    with _db_lock:
-        conn = get_db()
-        c = conn.cursor()
-        # Set task as expired so it won't be counted anymore
-        c.execute("UPDATE tasks SET expired=1 WHERE id=?", (task_id,))
-        conn.commit()
-        conn.close()
\ No newline at end of file
+    rows = await get_tasks_for_review(uploader_id, 1)
+    return rows[0] if rows else None
+
+def _verify(conn, now, task_id, uploader_id, reviewer_tg, accepted, reviewer_msg):
+    t = conn.execute(SQL["verify_task"], ("accepted" if accepted else "rejected", now, reviewer_tg, reviewer_msg,
+          0 if accepted else 1, task_id, uploader_id)).fetchone()
+    if t is None:
+        return None
+    waited = (now - t["proof_uploaded_at"]) // SECOND_MS
+    rollups.on_verify(conn, t["video_id"], t["assigned_to"], uploader_id, accepted, waited)
+    if accepted:
+        viewer = conn.execute(SQL["viewer_strikes"], (t["assigned_to"],)).fetchone()
+    else:
+        viewer = conn.execute(SQL["strike_user"], (t["assigned_to"],)).fetchone()
+        rollups.on_strike(conn, t["assigned_to"])
+    return {"task_id": task_id, "accepted": accepted, "viewer_id": t["assigned_to"],
+            "viewer_tg": viewer["tg_id"], "tenant_id": viewer["tenant_id"], "strikes": viewer["strikes"]}
+
+async def verify_tasks(uploader_id, reviewer_tg, decisions, reject_msg=None):
+    """Apply [(task_id, accepted)] for one uploader in a single transaction.
+
+    Returns the result of verify_task for each proof that was actually
+    reviewed; proofs already reviewed or expired are left out.
+    """
+    def verify(conn):
+        now = time_now()
+        results = [_verify(conn, now, task_id, uploader_id, reviewer_tg, accepted, None if accepted else reject_msg)
+                   for task_id, accepted in decisions]
+        return [r for r in results if r is not None]
+    results = await write(verify)
+    for r in results:
+        if r["accepted"]:
+            video_index.record_credit(r["viewer_id"], uploader_id)
+        else:
+            user_cache.invalidate((r["tenant_id"], r["viewer_tg"]))
+    return results
+
+async def verify_task(task_id, uploader_id, reviewer_tg, accepted, reviewer_msg=None):
+    """submitted -> verified, for a proof on one of uploader_id's videos.
+
+    A rejection also expires the task and strikes the viewer in the same
+    transaction. Returns {"task_id", "accepted", "viewer_id", "viewer_tg",
+    "tenant_id", "strikes"} or None if the proof was already reviewed, expired, or belongs
+    to someone else.
+    """
+    results = await verify_tasks(uploader_id, reviewer_tg, [(task_id, accepted)], reviewer_msg)
+    return results[0] if results else None
+
+async def increment_strike(tg_id, tenant_id=DEFAULT_TENANT):
+    def bump(conn):
+        row = conn.execute(SQL["strike_user_by_tg"], (tenant_id, tg_id)).fetchone()
+        if row is None: return
+        rollups.on_strike(conn, row["id"])
+        return row["strikes"]
+    new_strikes = await write(bump)
+    user_cache.invalidate((tenant_id, tg_id))
+    return new_strikes
@@ -0,0 +1,59 @@
+"""Bot configs for serving several bots (tenants) from one process and database.
+
+    BOTS_CONFIG=bots.json python main.py
+
+bots.json is a list of {"id": 1, "token": "...", "admins": [tg_id, ...], "name": "..."}.
+The id is stored on every user row, so it must never change for a bot.
+Without BOTS_CONFIG the process runs one bot as tenant 0, from BOT_TOKEN and
+ADMIN_IDS, which is also where rows from before multi-bot hosting live.
+
+A tenant's admins only manage that tenant. Commands that see or copy the
+whole process (/adminstats, /backup) are for operators, utils.ADMIN_IDS,
+through any of the bots.
+"""
+import json
+from contextvars import ContextVar
+from utils import ADMIN_IDS, get_token, get_bots_config
+
+DEFAULT_TENANT = 0
+
+# Tenant id of the update being handled; None in background jobs. Used for resource accounting.
+current_tenant = ContextVar("current_tenant", default=None)
+
+class Tenant:
+    def __init__(self, id, token, admins=(), name=""):
+        self.id = id
+        self.token = token
+        self.admins = frozenset(admins)
+        self.name = name or f"tenant{id}"
+        self.bot_id = int(token.split(":", 1)[0])
+
+    def is_admin(self, tg_id):
+        return tg_id in self.admins
+
+def load_tenants(path=None):
+    """Tenants from the BOTS_CONFIG file, or the single default tenant."""
+    path = path or get_bots_config()
+    if not path:
+        return [Tenant(DEFAULT_TENANT, get_token(), ADMIN_IDS)]
+    with open(path) as f:
+        tenants = [Tenant(c["id"], c["token"], c.get("admins", ()), c.get("name", "")) for c in json.load(f)]
+    for attr in ("id", "bot_id"):
+        values = [getattr(t, attr) for t in tenants]
+        if len(set(values)) != len(values):
+            raise ValueError(f"Duplicate tenant {attr} in {path}")
+    return tenants
+
+def is_operator(tg_id):
+    return tg_id in ADMIN_IDS
+
+_by_bot = {}
+_default = Tenant(DEFAULT_TENANT, "0:default", ADMIN_IDS)
+
+def register_tenants(tenants):
+    _by_bot.clear()
+    _by_bot.update((t.bot_id, t) for t in tenants)
+
+def tenant_for(bot):
+    """The Tenant a Bot serves; unregistered bots (tests, tools) get tenant 0."""
+    return _by_bot.get(bot.id, _default)
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from aiogram import BaseMiddleware
+from aiogram.types import Message
+from metrics import registry
+from middlewares import command_class
+
+# Highest priority first: reviews unblock other users' tasks, proofs unblock reviews.
+LANES = ("review", "proof", "task", "info")
+WORKERS = 16
+MAX_WAIT = 5  # seconds; a lane head waiting longer runs next regardless of priority
+STOP_TIMEOUT = 10
+
+def update_lane(update):
+    """Index into LANES for an incoming Update."""
+    event = update.callback_query or update.message
+    if event is None:
+        return LANES.index("info")
+    if isinstance(event, Message) and (event.document or event.text == "/submitproof"):
+        return LANES.index("proof")
+    cls = command_class(event)
+    if cls == "review_batch":
+        cls = "review"
+    return LANES.index(cls if cls in LANES else "info")
+
+class UpdateScheduler(BaseMiddleware):
+    """Runs updates on a fixed pool of workers, highest lane first, one at a time per user of each bot.
+
+    Register it as an outer middleware of dp.update, ahead of the FSM
+    middleware, so every update is queued before its state is read. Each user's updates run strictly in arrival
+    order; a user waits in the lane of their most urgent pending update, so a
+    queued review behind a /gettask still jumps the /gettask storm of others.
+    Until start() is called updates run inline, unscheduled.
+    """
+
+    def __init__(self, workers=WORKERS):
+        self.workers = workers
+        self._lanes = [deque() for _ in LANES]  # user keys ready to run; stale entries skipped
+        self._lane_of = {}                      # waiting user key -> lane it is queued in
+        self._jobs = {}                         # user key -> deque of pending jobs
+        self._running = set()
+        self._depth = [0] * len(LANES)
+        self._wakeup = asyncio.Event()
+        self._tasks = []
+        for lane in LANES:
+            registry.set("bot_update_queue_depth", 0, lane=lane)
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout=STOP_TIMEOUT):
+        """Finish queued updates (up to `timeout` seconds), then stop the workers."""
+        deadline = time.monotonic() + timeout
+        while (self._jobs or self._running) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for jobs in self._jobs.values():
+            for job in jobs:
+                job[2].cancel()
+        self._jobs.clear()
+
+    async def __call__(self, handler, event, data):
+        if not self._tasks:
+            return await handler(event, data)
+        lane = update_lane(event)
+        future = asyncio.get_running_loop().create_future()
+        from_user = data.get("event_from_user")
+        key = (data["bot"].id, from_user.id) if from_user else ("update", event.update_id)
+        self._jobs.setdefault(key, deque()).append((lane, time.monotonic(), future, handler, event, data))
+        self._count(lane, 1)
+        if key not in self._running:
+            self._schedule(key, lane)
+        return await future
+
+    def _count(self, lane, delta):
+        self._depth[lane] += delta
+        registry.set("bot_update_queue_depth", self._depth[lane], lane=LANES[lane])
+
+    def _schedule(self, key, lane):
+        current = self._lane_of.get(key)
+        if current is None or lane < current:
+            self._lane_of[key] = lane
+            self._lanes[lane].append(key)
+            self._wakeup.set()
+
+    def _head(self, lane):
+        queue = self._lanes[lane]
+        while queue and self._lane_of.get(queue[0]) != lane:
+            queue.popleft()
+        return queue[0] if queue else None
+
+    def _next(self):
+        heads = [(lane, key) for lane in range(len(LANES)) if (key := self._head(lane)) is not None]
+        if not heads:
+            return None
+        cutoff = time.monotonic() - MAX_WAIT
+        starved = [(self._jobs[key][0][1], lane, key) for lane, key in heads if self._jobs[key][0][1] < cutoff]
+        lane, key = min(starved)[1:] if starved else heads[0]
+        self._lanes[lane].popleft()
+        del self._lane_of[key]
+        return key
+
+    async def _worker(self):
+        while True:
+            key = self._next()
+            if key is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self._running.add(key)
+            lane, queued_at, future, handler, event, data = self._jobs[key].popleft()
+            self._count(lane, -1)
+            registry.observe("bot_update_wait_seconds", time.monotonic() - queued_at, lane=LANES[lane])
+            try:
+                if not future.done():
+                    result = await handler(event, data)
+                    if not future.done():
+                        future.set_result(result)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                if future.done():
+                    logging.exception("Update handler failed after its caller went away")
+                else:
+                    future.set_exception(e)
+            finally:
+                self._running.discard(key)
+                jobs = self._jobs.get(key)
+                if jobs:
+                    self._schedule(key, min(job[0] for job in jobs))
+                elif jobs is not None:
+                    del self._jobs[key]
+
+update_scheduler = UpdateScheduler()
@@ -1,4 +1,6 @@
 import os
+import time
+from datetime import datetime, timezone
 
 ADMIN_IDS = [5718213826]  # Replace with your Telegram user IDs
 
@@ -8,6 +10,86 @@ def is_admin(user_id):
 def get_token():
     return os.environ.get('BOT_TOKEN', '6547874705:AAFEcs-AG3pRlU5tqrj-pZunp_TyXB7oHFA')
 
+# Every stored timestamp is an INTEGER of UTC epoch milliseconds.
+SECOND_MS = 1000
+DAY_MS = 24 * 60 * 60 * SECOND_MS
+
 def time_now():
-    from datetime import datetime
-    return datetime.utcnow().isoformat()
+    """Current time as epoch milliseconds."""
+    return time.time_ns() // 1_000_000
+
+def ms_to_datetime(ms):
+    return datetime.fromtimestamp(ms / SECOND_MS, timezone.utc)
+
+def ms_to_day(ms):
+    """UTC calendar day (YYYY-MM-DD) of an epoch-ms timestamp."""
+    return ms_to_datetime(ms).date().isoformat()
+
+def days_ago(days):
+    return time_now() - days * DAY_MS
+
+def split_message(text, limit=4096):
+    """Split text on line boundaries into chunks Telegram will accept."""
+    chunks, current = [], ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current or not chunks:
+        chunks.append(current)
+    return chunks
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, n=1):
+        self._refill()
+        if self.tokens >= n:
+            self.tokens -= n
+            return True
+        return False
+
+    def delay(self, n=1):
+        """Seconds until `n` tokens are available."""
+        self._refill()
+        return max(0.0, (n - self.tokens) / self.rate)
+
+def get_mode():
+    """'polling' (default) or 'webhook'."""
+    return os.environ.get('BOT_MODE', 'polling')
+
+def get_webhook_config():
+    return {
+        "url": os.environ.get('WEBHOOK_URL', ''),
+        "host": os.environ.get('WEBHOOK_HOST', '127.0.0.1'),
+        "port": int(os.environ.get('WEBHOOK_PORT', 8080)),
+        "path": os.environ.get('WEBHOOK_PATH', '/webhook'),
+        "secret": os.environ.get('WEBHOOK_SECRET') or None,
+        "concurrency": int(os.environ.get('WEBHOOK_CONCURRENCY', 64)),
+    }
+
+def get_bots_config():
+    """Path of the multi-bot config (see tenants.py); empty for a single bot."""
+    return os.environ.get('BOTS_CONFIG', '')
+
+def get_metrics_port():
+    """Port for the Prometheus /metrics endpoint; 0 disables it."""
+    return int(os.environ.get('METRICS_PORT', 0))
@@ -0,0 +1,83 @@
+import asyncio
+import aiohttp
+from aiohttp import web
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """Acknowledges each update with 200 before its handlers run.
+
+    At most `concurrency` updates are in flight; once that many are being
+    processed, new requests wait for a free slot before being acknowledged,
+    which pushes back on Telegram instead of queueing without bound. Handlers
+    for several bots can share one budget by passing the same `slots`.
+    """
+
+    def __init__(self, dispatcher, bot, concurrency=64, slots=None, **kwargs):
+        super().__init__(dispatcher, bot, handle_in_background=True, **kwargs)
+        self._slots = slots or asyncio.Semaphore(concurrency)
+
+    async def _handle_request_background(self, bot, request):
+        await self._slots.acquire()
+        try:
+            return await super()._handle_request_background(bot, request)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    async def _background_feed_update(self, bot, update):
+        try:
+            await super()._background_feed_update(bot, update)
+        finally:
+            self._slots.release()
+
+def bot_paths(bots, path="/webhook"):
+    """{webhook path: Bot} for {tenant id: Bot}; a single bot keeps the bare path."""
+    if len(bots) == 1:
+        return {path: next(iter(bots.values()))}
+    return {f"{path}/{tenant_id}": bot for tenant_id, bot in bots.items()}
+
+def create_app(dp, bots, path="/webhook", secret=None, concurrency=64):
+    app = web.Application()
+    slots = asyncio.Semaphore(concurrency)
+    for bot_path, bot in bot_paths(bots, path).items():
+        BoundedRequestHandler(dp, bot, slots=slots, secret_token=secret).register(app, path=bot_path)
+    setup_application(app, dp, bots=list(bots.values()))
+    return app
+
+async def run_webhook(dp, bots, url="", host="127.0.0.1", port=8080, path="/webhook", secret=None, concurrency=64):
+    """Serve the dispatcher for {tenant id: Bot} behind a local aiohttp server until cancelled."""
+    runner = web.AppRunner(create_app(dp, bots, path, secret, concurrency))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    if url:
+        for bot_path, bot in bot_paths(bots, path).items():
+            await bot.set_webhook(url + bot_path, secret_token=secret, drop_pending_updates=False)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+class FakeTelegramClient:
+    """Posts raw updates to a webhook the way Telegram does; for local tests and benchmarks."""
+
+    def __init__(self, url, secret=None):
+        self.url = url
+        self.headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+        self._session = None
+        self._next_id = 1
+
+    async def __aenter__(self):
+        self._session = aiohttp.ClientSession()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    async def post(self, update):
+        """Send one update (dict or aiogram Update); returns the HTTP status."""
+        if not isinstance(update, dict):
+            update = update.model_dump(mode="json", exclude_none=True)
+        update.setdefault("update_id", self._next_id)
+        self._next_id = update["update_id"] + 1
+        async with self._session.post(self.url, json=update, headers=self.headers) as resp:
+            return resp.status